@@ -11,9 +11,11 @@ __revision__ = '$Format:%H$'
 import os
 import sys
 import inspect
+import threading
 
 from qgis.core import QgsProcessingAlgorithm, QgsApplication
 from .qgisfmeformalgorithm_provider import QGISFMEFormAlgorithmProvider
+from .qgisfmeformalgorithm_lifecycle import sweep_orphans
 
 cmd_folder = os.path.split(inspect.getfile(inspect.currentframe()))[0]
 
@@ -30,6 +32,8 @@ class QGISFMEFormAlgorithmPlugin(object):
         """Init Processing provider for QGIS >= 3.8."""
         self.provider = QGISFMEFormAlgorithmProvider()
         QgsApplication.processingRegistry().addProvider(self.provider)
+        # Remove exchange files left behind by crashed sessions without delaying startup
+        threading.Thread(target=sweep_orphans, daemon=True).start()
 
     def initGui(self):
         self.initProcessing()
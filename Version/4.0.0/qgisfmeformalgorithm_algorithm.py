@@ -15,6 +15,7 @@ __revision__ = '$Format:%H$'
 # - Included detailed error reporting with line numbers in error message boxes.
 # - Removed all QMessageBox.information instances.
 # - Migrated from Qt5 to Qt6 for QGIS 4.0 and above.
+# - Input features are streamed to the exchange file in batches.
 # ---------------------------------------------------------
 
 import traceback
@@ -29,10 +30,27 @@ from PyQt6.QtGui import QStandardItemModel, QStandardItem, QIcon, QPainter, QCol
 from qgis.core import (
     QgsProcessingAlgorithm, QgsProcessingParameterFeatureSource,
     QgsProcessingParameterString, QgsProcessingParameterFeatureSink,
-    QgsProcessingOutputString, QgsVectorLayer, QgsVectorFileWriter, Qgis, QgsMessageLog, QgsProcessing, QgsProcessingParameterDefinition
+    QgsProcessingOutputString, QgsVectorLayer, QgsVectorFileWriter, Qgis, QgsMessageLog, QgsProcessing, QgsProcessingParameterDefinition,
+    QgsProcessingParameterBoolean, QgsProcessingParameterEnum, QgsProcessingParameterNumber,
+    QgsProcessingParameterField, QgsProcessingParameterExtent, QgsProcessingParameterExpression,
+    QgsProcessingParameterMultipleLayers, QgsVectorLayerFeatureSource, QgsProcessingParameterCrs,
+    QgsProcessingMultiStepFeedback, QgsProcessingContext, QgsProcessingOutputMultipleLayers, QgsProcessingUtils,
+    QgsFields, QgsWkbTypes, QgsCoordinateReferenceSystem, QgsProcessingException
 )
 from qgis.gui import QgsFileWidget
 from processing.gui.wrappers import WidgetWrapper
+from .qgisfmeformalgorithm_exchange import (
+    EXCHANGE_FORMATS, passthrough_dataset, source_dataset_parameter,
+    dest_dataset_parameter, exchange_format_for_parameter, exchange_table_name, sublayer_names,
+    check_exchange_format, import_layer, pipes_supported, run_fme, open_pipe_writer, write_geojson,
+    open_pipe_reader, import_geojson_stream, with_export_options, AttributeRestorer,
+    export_source_sharded, fme_dataset_list, ogr_file_dataset, exchange_settings, output_datasets, merged_schema,
+    direct_write_dataset, direct_write_output, output_feature_types, GeometryTypeSinks, LayerSnapshot, estimate_exchange_size, exchange_directory,
+    directory_throughput, compression_level, with_compression, export_source, BackgroundFeedback
+)
+from .qgisfmeformalgorithm_lifecycle import ExchangeRun
+from .qgisfmeformalgorithm_cache import ExportCache, export_cache_key, change_token
+from .qgisfmeformalgorithm_delta import DeltaState, delta_key, delta_plan, feature_hashes, stored_fields
 
 import os
 import re
@@ -40,11 +58,13 @@ import tempfile
 import subprocess
 import uuid
 import shutil
+import copy
 import xml.etree.ElementTree as ET
 from qgis import core
 from qgis.utils import iface
 import configparser
 import shlex  # Import shlex
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import platform
 
@@ -86,6 +106,177 @@ def _filesystem_roots():
     else:
         return ['/']
 
+
+def _workspace_path(cmd_list):
+    """Return the workspace (.fmw) path from a split FME command, or None."""
+    for arg in cmd_list[1:]:
+        if arg.lower().endswith('.fmw'):
+            return arg
+    return None
+
+
+def _read_workspace_header(fmw_path):
+    """Return the first header block of an FMW file with the '#!' prefixes removed."""
+    lines = []
+    with open(fmw_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if line.startswith('#! </WORKSPACE>'):
+                break
+            if line.startswith('#!'):
+                lines.append(line[2:].strip())
+    return '\n'.join(lines)
+
+
+def _workspace_datasets(fmw_path):
+    """Return the reader and writer datasets declared in the workspace header.
+
+    Each dataset is a dict of its header attributes (ROLE, FORMAT, DATASET, ...)
+    plus a PARAMETER key holding the published parameter bound to DATASET,
+    e.g. SourceDataset_GEOJSON.
+    """
+    if not fmw_path or not os.path.exists(fmw_path):
+        return []
+    datasets = []
+    for block in re.findall(r'<DATASET\b(.*?)>', _read_workspace_header(fmw_path), re.S):
+        attrs = dict(re.findall(r'(\w+)="([^"]*)"', block))
+        if 'ROLE' not in attrs:
+            continue
+        macro = re.match(r'\$\((\w+)\)', attrs.get('DATASET', ''))
+        attrs['PARAMETER'] = macro.group(1) if macro else None
+        datasets.append(attrs)
+    return datasets
+
+
+def _workspace_feature_types(fmw_path, keyword):
+    """Return the feature types the workspace writer with the given KEYWORD declares.
+
+    Names are returned in workspace order; disabled feature types and those
+    named at run time, e.g. @Value(fme_feature_type), are left out.
+    """
+    if not fmw_path or not os.path.exists(fmw_path) or not keyword:
+        return []
+    names = []
+    for block in re.findall(r'<FEATURE_TYPE\b(.*?)>', _read_workspace_header(fmw_path), re.S):
+        attrs = dict(re.findall(r'(\w+)="([^"]*)"', block))
+        if attrs.get('IS_SOURCE') != 'false' or attrs.get('KEYWORD') != keyword or attrs.get('ENABLED') == 'false':
+            continue
+        name = attrs.get('FEATURE_TYPE_NAME') or attrs.get('NODE_NAME', '')
+        if name and '@' not in name and '$(' not in name and name not in names:
+            names.append(name)
+    return names
+
+
+def _workspace_field_references(fmw_path, field_names):
+    """Return the field names that appear anywhere in the workspace.
+
+    Feature type definitions, transformer settings, @Value() references and
+    published parameters are all covered by a plain text search, on the raw
+    text and on the text with FME's name escapes (<space>, <u00e4>,
+    <opencurly> ...) decoded. Returns None when the workspace cannot be read.
+    """
+    if not fmw_path or not os.path.exists(fmw_path):
+        return None
+    with open(fmw_path, 'r', encoding='utf-8', errors='ignore') as f:
+        text = f.read()
+    decoded = _decode_fme_names(text)
+    return [name for name in field_names if name in text or name in decoded]
+
+
+# Characters FME writes as <name> escapes in workspace files.
+_FME_NAME_ESCAPES = {
+    'space': ' ', 'tab': '\t', 'lf': '\n', 'cr': '\r', 'comma': ',', 'semicolon': ';', 'colon': ':',
+    'quote': '"', 'apos': "'", 'backslash': '\\', 'solidus': '/', 'at': '@', 'dollar': '$', 'amp': '&',
+    'lt': '<', 'gt': '>', 'openparen': '(', 'closeparen': ')', 'opencurly': '{', 'closecurly': '}',
+    'openbracket': '[', 'closebracket': ']', 'hash': '#', 'percent': '%', 'equal': '=', 'plus': '+',
+}
+
+# Transformers that can read or write any attribute without naming it.
+_GENERIC_ATTRIBUTE_TRANSFORMERS = (
+    'PythonCaller', 'PythonCreator', 'TclCaller', 'RCaller', 'BulkAttributeRenamer', 'AttributeExploder',
+    'AttributeExposer', 'SchemaMapper', 'SchemaScanner', 'FeatureWriter',
+)
+
+
+def _decode_fme_names(text):
+    """Decode FME's <name> and <uXXXX> escapes in workspace text, unknown escapes are kept."""
+    def decode(match):
+        token = match.group(1)
+        if re.match(r'u[0-9a-fA-F]{4}$', token):
+            return chr(int(token[1:], 16))
+        return _FME_NAME_ESCAPES.get(token, match.group(0))
+    return re.sub(r'<(u[0-9a-fA-F]{4}|[a-z]+)>', decode, text)
+
+
+def _generic_attribute_transformers(fmw_path):
+    """Return the transformer types in the workspace that use attributes without naming them."""
+    if not fmw_path or not os.path.exists(fmw_path):
+        return []
+    with open(fmw_path, 'r', encoding='utf-8', errors='ignore') as f:
+        types = set(re.findall(r'<TRANSFORMER\b[^>]*?\bTYPE="(\w+)"', f.read()))
+    return [name for name in _GENERIC_ATTRIBUTE_TRANSFORMERS if name in types]
+
+
+def _fme_coordsys_crs(coordsys):
+    """Return the QgsCoordinateReferenceSystem for an FME coordinate system name, invalid if unknown."""
+    from qgis.core import QgsCoordinateReferenceSystem
+    name = (coordsys or '').strip()
+    if not name:
+        return QgsCoordinateReferenceSystem()
+    if name.upper() in ('LL84', 'LL-WGS84', 'WGS84'):
+        return QgsCoordinateReferenceSystem('EPSG:4326')
+    return QgsCoordinateReferenceSystem(name)
+
+
+def _parse_input_mapping(text):
+    """Parse 'layer=SourceDataset_X' pairs separated by ';' or new lines into a dict."""
+    mapping = {}
+    for item in re.split(r'[;\n]', text or ''):
+        if '=' in item:
+            layer_name, parameter = item.split('=', 1)
+            mapping[layer_name.strip()] = parameter.strip()
+    return mapping
+
+
+def _map_input_layers(layers, reader_parameters, mapping):
+    """Pair each layer with a workspace reader parameter.
+
+    Layers named (by layer name or id) in the explicit mapping get their
+    reader, the others take the remaining readers in workspace order.
+
+    :return: List of (layer, parameter) tuples, parameter is None when no reader is left.
+    """
+    available = list(reader_parameters)
+    for parameter in mapping.values():
+        if parameter in available:
+            available.remove(parameter)
+    pairs = []
+    for layer in layers:
+        parameter = mapping.get(layer.name()) or mapping.get(layer.id())
+        if parameter is None and available:
+            parameter = available.pop(0)
+        pairs.append((layer, parameter))
+    return pairs
+
+
+def _strip_dataset_arguments(cmd_list, parameters):
+    """Remove the --<parameter> <value> pairs of the given parameters, the algorithm supplies their values.
+
+    Dataset parameters of other readers and writers, e.g. a fixed lookup
+    dataset, are left as the user set them.
+    """
+    options = {f'--{parameter}' for parameter in parameters if parameter}
+    stripped = []
+    skip_value = False
+    for arg in cmd_list:
+        if skip_value:
+            skip_value = False
+            continue
+        if arg in options:
+            skip_value = True
+            continue
+        stripped.append(arg)
+    return stripped
+
 class CollapsibleGroupBox(QGroupBox):
     def __init__(self, title):
         super().__init__()
@@ -149,6 +340,35 @@ class QGISFMEFormAlgorithmAlgorithm(QgsProcessingAlgorithm):
     OUTPUT_LAYER = 'OUTPUT_LAYER'
     OUTPUT_TEXT = 'OUTPUT_TEXT'
     COMMAND = 'COMMAND'
+    PASS_THROUGH = 'PASS_THROUGH'
+    EXCHANGE_FORMAT = 'EXCHANGE_FORMAT'
+    PIPE_INPUT = 'PIPE_INPUT'
+    PIPE_OUTPUT = 'PIPE_OUTPUT'
+    COORDINATE_PRECISION = 'COORDINATE_PRECISION'
+    RFC7946 = 'RFC7946'
+    DROP_NULLS = 'DROP_NULLS'
+    FIELDS = 'FIELDS'
+    PROJECT_FIELDS = 'PROJECT_FIELDS'
+    SELECTED_ONLY = 'SELECTED_ONLY'
+    EXTENT = 'EXTENT'
+    FILTER_EXPRESSION = 'FILTER_EXPRESSION'
+    EXPORT_THREADS = 'EXPORT_THREADS'
+    COMPRESS_EXCHANGE = 'COMPRESS_EXCHANGE'
+    CACHE_EXPORT = 'CACHE_EXPORT'
+    INPUT_LAYERS = 'INPUT_LAYERS'
+    INPUT_MAPPING = 'INPUT_MAPPING'
+    TARGET_CRS = 'TARGET_CRS'
+    ROLLOVER_MB = 'ROLLOVER_MB'
+    ROLLOVER_FEATURES = 'ROLLOVER_FEATURES'
+    DELTA_MODE = 'DELTA_MODE'
+    FULL_REFRESH = 'FULL_REFRESH'
+    DIRECT_WRITE = 'DIRECT_WRITE'
+    SPLIT_FEATURE_TYPES = 'SPLIT_FEATURE_TYPES'
+    OUTPUT_LAYERS = 'OUTPUT_LAYERS'
+    OUTPUT_POINTS = 'OUTPUT_POINTS'
+    OUTPUT_LINES = 'OUTPUT_LINES'
+    OUTPUT_POLYGONS = 'OUTPUT_POLYGONS'
+    REFERENCE_OUTPUT = 'REFERENCE_OUTPUT'
 
     class CustomParametersWidget(WidgetWrapper): 
         def createWidget(self, **kwargs):
@@ -329,6 +549,74 @@ class QGISFMEFormAlgorithmAlgorithm(QgsProcessingAlgorithm):
             )
         )
 
+        # Further input layers for workspaces with several readers
+        self.addParameter(
+            QgsProcessingParameterMultipleLayers(
+                self.INPUT_LAYERS,
+                self.tr('Additional input layers (read by the further workspace readers)'),
+                layerType=QgsProcessing.TypeVectorAnyGeometry,
+                optional=True
+            )
+        )
+        input_mapping_param = QgsProcessingParameterString(
+            self.INPUT_MAPPING,
+            self.tr('Reader of each additional layer (layer=SourceDataset_X; ..., default: workspace order)'),
+            optional=True
+        )
+        input_mapping_param.setFlags(input_mapping_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(input_mapping_param)
+
+        # Filters applied by the data provider before the input is exported
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.SELECTED_ONLY,
+                self.tr('Selected features only'),
+                defaultValue=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterExtent(
+                self.EXTENT,
+                self.tr('Only features intersecting extent'),
+                optional=True
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterExpression(
+                self.FILTER_EXPRESSION,
+                self.tr('Only features matching expression'),
+                parentLayerParameterName=self.INPUT_LAYER,
+                optional=True
+            )
+        )
+
+        # Reproject while exporting, to the coordinate system the workspace reads
+        self.addParameter(
+            QgsProcessingParameterCrs(
+                self.TARGET_CRS,
+                self.tr('Target CRS of the exported input (empty: coordinate system of the workspace reader)'),
+                optional=True
+            )
+        )
+
+        # Attribute projection: export only the fields the workspace uses
+        self.addParameter(
+            QgsProcessingParameterField(
+                self.FIELDS,
+                self.tr('Fields to export (empty: all fields, or those referenced by the workspace with the option below)'),
+                parentLayerParameterName=self.INPUT_LAYER,
+                allowMultiple=True,
+                optional=True
+            )
+        )
+        project_fields_param = QgsProcessingParameterBoolean(
+            self.PROJECT_FIELDS,
+            self.tr('Export only fields referenced by the workspace, re-attach the others on import'),
+            defaultValue=False
+        )
+        project_fields_param.setFlags(project_fields_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(project_fields_param)
+
         # Output layer parameter
         self.addParameter(
             QgsProcessingParameterFeatureSink(
@@ -336,6 +624,20 @@ class QGISFMEFormAlgorithmAlgorithm(QgsProcessingAlgorithm):
                 self.tr('Output Layer')
             )
         )
+        # Optional outputs the mixed geometry output of FME is split into
+        for name, label, layer_type in (
+                (self.OUTPUT_POINTS, 'Output Points', QgsProcessing.TypeVectorPoint),
+                (self.OUTPUT_LINES, 'Output Lines', QgsProcessing.TypeVectorLine),
+                (self.OUTPUT_POLYGONS, 'Output Polygons', QgsProcessing.TypeVectorPolygon)):
+            self.addParameter(
+                QgsProcessingParameterFeatureSink(
+                    name,
+                    self.tr(label),
+                    type=layer_type,
+                    optional=True,
+                    createByDefault=False
+                )
+            )
 
         # Command string parameter (multi-line) using Custom Widget
         command_param = QgsProcessingParameterString(
@@ -348,6 +650,140 @@ class QGISFMEFormAlgorithmAlgorithm(QgsProcessingAlgorithm):
         command_param.setMetadata({'widget_wrapper': {'class': self.CustomParametersWidget}})
         self.addParameter(command_param)
 
+        # Hand file-based inputs to FME as-is instead of exporting them
+        pass_through_param = QgsProcessingParameterBoolean(
+            self.PASS_THROUGH,
+            self.tr('Pass file-based input layers directly to FME when possible'),
+            defaultValue=True
+        )
+        pass_through_param.setFlags(pass_through_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(pass_through_param)
+
+        # Format of the files exchanged with FME, must match the workspace reader/writer
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.EXCHANGE_FORMAT,
+                self.tr('Exchange format'),
+                options=[f['label'] for f in EXCHANGE_FORMATS.values()],
+                defaultValue=0
+            )
+        )
+
+        # Stream the input to FME through a named pipe (Linux only)
+        pipe_input_param = QgsProcessingParameterBoolean(
+            self.PIPE_INPUT,
+            self.tr('Stream input to FME through a named pipe (Linux, GeoJSON only)'),
+            defaultValue=False
+        )
+        pipe_input_param.setFlags(pipe_input_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(pipe_input_param)
+
+        # Read FME's output through a named pipe while it is still being written (Linux only)
+        pipe_output_param = QgsProcessingParameterBoolean(
+            self.PIPE_OUTPUT,
+            self.tr('Stream output from FME through a named pipe (Linux, GeoJSON only)'),
+            defaultValue=False
+        )
+        pipe_output_param.setFlags(pipe_output_param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+        self.addParameter(pipe_output_param)
+
+        # Lean GeoJSON export options
+        precision_param = QgsProcessingParameterNumber(
+            self.COORDINATE_PRECISION,
+            self.tr('Coordinate precision in decimals for GeoJSON exchange (-1 keeps full precision)'),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=-1,
+            minValue=-1
+        )
+        rfc7946_param = QgsProcessingParameterBoolean(
+            self.RFC7946,
+            self.tr('Write RFC 7946 GeoJSON (WGS 84, 7 decimals unless set above)'),
+            defaultValue=False
+        )
+        drop_nulls_param = QgsProcessingParameterBoolean(
+            self.DROP_NULLS,
+            self.tr('Leave out null properties in GeoJSON exchange'),
+            defaultValue=False
+        )
+        # Split very large exports into shard files written in parallel
+        threads_param = QgsProcessingParameterNumber(
+            self.EXPORT_THREADS,
+            self.tr('Export threads (large inputs are split into shard files)'),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=1,
+            minValue=1,
+            maxValue=64
+        )
+        # gzip the exchange input for slow (network) exchange directories
+        compress_param = QgsProcessingParameterBoolean(
+            self.COMPRESS_EXCHANGE,
+            self.tr('Compress exchange input with gzip (GeoJSON only, level adapts to the exchange directory)'),
+            defaultValue=False
+        )
+        # Reuse the export of an unchanged layer across runs
+        cache_param = QgsProcessingParameterBoolean(
+            self.CACHE_EXPORT,
+            self.tr('Reuse the exported input while the layer is unchanged (export cache)'),
+            defaultValue=False
+        )
+        # Keep single exchange files small enough for FME's readers and the file system
+        rollover_mb_param = QgsProcessingParameterNumber(
+            self.ROLLOVER_MB,
+            self.tr('Start a new exchange file every N MB (0 = single file)'),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=0,
+            minValue=0
+        )
+        rollover_features_param = QgsProcessingParameterNumber(
+            self.ROLLOVER_FEATURES,
+            self.tr('Start a new exchange file every N features (0 = single file)'),
+            type=QgsProcessingParameterNumber.Integer,
+            defaultValue=0,
+            minValue=0
+        )
+        # Only send the features changed since the previous run of the workspace
+        delta_param = QgsProcessingParameterBoolean(
+            self.DELTA_MODE,
+            self.tr('Delta mode: only send features changed since the previous run (workspace must keep _qgis_fid)'),
+            defaultValue=False
+        )
+        full_refresh_param = QgsProcessingParameterBoolean(
+            self.FULL_REFRESH,
+            self.tr('Full refresh: ignore the previous run and send all features'),
+            defaultValue=False
+        )
+        # Skip the copy stage when the workspace can write the output file itself
+        direct_write_param = QgsProcessingParameterBoolean(
+            self.DIRECT_WRITE,
+            self.tr('Let a GeoPackage workspace writer write the output file directly'),
+            defaultValue=False
+        )
+        # Load every feature type the workspace writes as its own layer
+        split_param = QgsProcessingParameterBoolean(
+            self.SPLIT_FEATURE_TYPES,
+            self.tr('One output layer per writer feature type (the first one is the Output Layer)'),
+            defaultValue=False
+        )
+        # Hand back FME's output file itself instead of copying it into the sink
+        reference_param = QgsProcessingParameterBoolean(
+            self.REFERENCE_OUTPUT,
+            self.tr('Return the FME output file by reference, without copying (kept for result_days)'),
+            defaultValue=False
+        )
+        for param in (precision_param, rfc7946_param, drop_nulls_param, threads_param, compress_param,
+                      cache_param, rollover_mb_param, rollover_features_param, delta_param, full_refresh_param,
+                      direct_write_param, split_param, reference_param):
+            param.setFlags(param.flags() | QgsProcessingParameterDefinition.FlagAdvanced)
+            self.addParameter(param)
+
+        # Output layers of all feature types when they are split
+        self.addOutput(
+            QgsProcessingOutputMultipleLayers(
+                self.OUTPUT_LAYERS,
+                self.tr('Output Layers per Feature Type')
+            )
+        )
+
         # Output text parameter
         self.addOutput(
             QgsProcessingOutputString(
@@ -366,12 +802,53 @@ class QGISFMEFormAlgorithmAlgorithm(QgsProcessingAlgorithm):
         import uuid
         import os
         import re
-        from qgis.core import QgsVectorFileWriter, QgsVectorLayer, QgsProcessingException, QgsFeatureSink
+        from qgis.core import (
+            QgsVectorFileWriter, QgsVectorLayer, QgsProcessingException, QgsFeatureSink,
+            QgsProcessingFeatureSourceDefinition, QgsFields, QgsWkbTypes, QgsCoordinateReferenceSystem,
+            QgsFeatureRequest
+        )
+        run = None
+        extra_executor = None
         try:
             # Get parameters
             command = self.parameterAsString(parameters, self.COMMAND, context)
             input_source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
             output_layer_param = self.OUTPUT_LAYER
+
+            # Push the selection, extent and expression filters down to the provider
+            feature_request = QgsFeatureRequest()
+            filters = []
+            if input_source is not None:
+                if self.parameterAsBoolean(parameters, self.SELECTED_ONLY, context):
+                    # Only a layer loaded in the project has a selection, a path would be loaded without one
+                    input_layer = self.parameterAsVectorLayer(parameters, self.INPUT_LAYER, context)
+                    if (input_layer is None or context.project() is None
+                            or context.project().mapLayer(input_layer.id()) is None):
+                        raise QgsProcessingException(
+                            "Selected features only needs an input layer loaded in the project, "
+                            "the input is a file path or data source without a selection.")
+                    definition = parameters.get(self.INPUT_LAYER)
+                    if isinstance(definition, QgsProcessingFeatureSourceDefinition):
+                        # Copy the definition to keep its feature limit, flags and filter expression
+                        definition = QgsProcessingFeatureSourceDefinition(definition)
+                        definition.selectedFeaturesOnly = True
+                    else:
+                        definition = QgsProcessingFeatureSourceDefinition(input_layer.id(), True)
+                    parameters = dict(parameters)
+                    parameters[self.INPUT_LAYER] = definition
+                    input_source = self.parameterAsSource(parameters, self.INPUT_LAYER, context)
+                    filters.append('selected features')
+                extent = self.parameterAsExtent(parameters, self.EXTENT, context, input_source.sourceCrs())
+                if not extent.isNull() and not extent.isEmpty():
+                    feature_request.setFilterRect(extent)
+                    filters.append(f'extent {extent.toString(3)}')
+                expression = self.parameterAsExpression(parameters, self.FILTER_EXPRESSION, context)
+                if expression:
+                    feature_request.setFilterExpression(expression)
+                    feature_request.setExpressionContext(self.createExpressionContext(parameters, context, input_source))
+                    filters.append(f'expression {expression}')
+                if filters:
+                    feedback.pushInfo(f"Exporting only input features matching: {', '.join(filters)}")
             
             # Check if the command contains the default placeholder workspace path
             if 'path/to/workspace.fmw' in command:
@@ -382,57 +859,415 @@ class QGISFMEFormAlgorithmAlgorithm(QgsProcessingAlgorithm):
             if '###PATHS_INFO###' in command:
                 command = command.split('###PATHS_INFO###')[0].strip()
 
-            # Convert input to QgsVectorLayer if needed
-            input_layer = input_source
-            if input_layer is not None and not isinstance(input_layer, QgsVectorLayer):
-                # Create memory layer from source
-                fields = input_layer.fields()
-                crs = input_layer.sourceCrs()
-                wkb = input_layer.wkbType()
-                from qgis.core import QgsVectorLayer, QgsWkbTypes
-                mem_layer = QgsVectorLayer(f"{QgsWkbTypes.displayString(wkb)}?crs={crs.authid()}", "temp_export", "memory")
-                mem_layer.dataProvider().addAttributes(fields)
-                mem_layer.updateFields()
-                feats = [f for f in input_layer.getFeatures()]
-                mem_layer.dataProvider().addFeatures(feats)
-                mem_layer.updateExtents()
-                input_layer = mem_layer
-
-            # Generate unique temp file paths for input/output GeoJSON
-            unique_id = uuid.uuid4().hex
-            temp_dir = tempfile.gettempdir()
-            input_geojson = os.path.join(temp_dir, f"fme_input_{unique_id}.geojson")
-            output_geojson = os.path.join(temp_dir, f"fme_output_{unique_id}.geojson")
-
-            # Export input layer to GeoJSON
-            if input_layer is not None:
-                QgsVectorFileWriter.writeAsVectorFormat(
-                    input_layer, input_geojson, "utf-8", input_layer.sourceCrs(), "GeoJSON"
-                )
-            else:
-                # If no input layer, ensure the input_geojson path is still set for the command
-                # Potentially create an empty placeholder or handle this case differently if FME requires it
-                # For now, we'll pass the path, FME might handle missing files gracefully or error out
-                pass # input_geojson path is already defined
-
             # Prepare the command list using shlex
             try:
                 cmd_list = shlex.split(command) # Split base command safely
             except ValueError as e:
                 feedback.reportError(f"Error parsing the base FME command: {e}. Check quoting.")
                 raise QgsProcessingException(f"Error parsing FME command: {e}")
-
-            # Append GeoJSON parameters to the list
-            if input_layer is not None:
-                cmd_list.extend(['--SourceDataset_GEOJSON', input_geojson])
-            cmd_list.extend(['--DestDataset_GEOJSON', output_geojson])
+            workspace_datasets = _workspace_datasets(_workspace_path(cmd_list))
+
+            # Resolve the exchange format and the workspace parameters it maps to
+            exchange_format = list(EXCHANGE_FORMATS.values())[
+                self.parameterAsEnum(parameters, self.EXCHANGE_FORMAT, context)]
+            check_exchange_format(exchange_format)
+            coordinate_precision = self.parameterAsInt(parameters, self.COORDINATE_PRECISION, context)
+            rfc7946 = self.parameterAsBoolean(parameters, self.RFC7946, context)
+            drop_nulls = self.parameterAsBoolean(parameters, self.DROP_NULLS, context)
+            if exchange_format['driver'] != 'GeoJSON' and (coordinate_precision >= 0 or rfc7946 or drop_nulls):
+                feedback.pushWarning("Coordinate precision, RFC 7946 and null dropping only apply to the GeoJSON exchange format.")
+            exchange_format = with_export_options(exchange_format, coordinate_precision, rfc7946, drop_nulls)
+            source_parameter = source_dataset_parameter(exchange_format)
+            dest_parameter = dest_dataset_parameter(exchange_format)
+            # Dataset paths shown in the widget are placeholders, the run supplies the real ones
+            cmd_list = _strip_dataset_arguments(cmd_list, [source_parameter, dest_parameter])
+            for role, parameter in (('READER', source_parameter), ('WRITER', dest_parameter)):
+                declared = [d['PARAMETER'] for d in workspace_datasets if d.get('ROLE') == role and d.get('PARAMETER')]
+                if declared and parameter not in declared:
+                    feedback.pushWarning(f"The workspace does not publish {parameter} (found {', '.join(declared)}). "
+                                         f"Choose the exchange format matching the workspace {role.lower()}.")
+
+            # Reproject during the export, to the target CRS or the one the workspace reader declares
+            reprojecting = False
+            if input_source is not None:
+                target_crs = self.parameterAsCrs(parameters, self.TARGET_CRS, context)
+                if not target_crs.isValid():
+                    reader = next((d for d in workspace_datasets if d.get('PARAMETER') == source_parameter), {})
+                    target_crs = _fme_coordsys_crs(reader.get('COORDSYS'))
+                    if target_crs.isValid():
+                        feedback.pushInfo(f"Target CRS {target_crs.authid()} taken from the workspace reader")
+                if target_crs.isValid() and target_crs != input_source.sourceCrs():
+                    feature_request.setDestinationCrs(target_crs, context.transformContext())
+                    reprojecting = True
+                    feedback.pushInfo(f"Reprojecting input from {input_source.sourceCrs().authid()} to {target_crs.authid()} during export")
+                    if not feature_request.filterRect().isNull():
+                        # With a destination CRS the filter rectangle is given in that CRS
+                        feature_request.setFilterRect(
+                            self.parameterAsExtent(parameters, self.EXTENT, context, target_crs))
+
+            # Try handing a file-based input straight to the workspace reader
+            delta_mode = input_source is not None and self.parameterAsBoolean(parameters, self.DELTA_MODE, context)
+            passthrough_args = None
+            if input_source is not None and (filters or reprojecting or delta_mode) and self.parameterAsBoolean(parameters, self.PASS_THROUGH, context):
+                feedback.pushInfo("Pass-through not possible (input is filtered, reprojected or sent as delta), exporting input")
+            elif input_source is not None and self.parameterAsBoolean(parameters, self.PASS_THROUGH, context):
+                source_definition = parameters.get(self.INPUT_LAYER)
+                if not isinstance(source_definition, QgsProcessingFeatureSourceDefinition):
+                    source_definition = None
+                passthrough_args, reason = passthrough_dataset(
+                    self.parameterAsVectorLayer(parameters, self.INPUT_LAYER, context),
+                    source_definition, workspace_datasets)
+                if passthrough_args:
+                    feedback.pushInfo(f"Pass-through: {reason}, skipping export")
+                else:
+                    feedback.pushInfo(f"Pass-through not possible ({reason}), exporting input")
+
+            # Unfiltered OGR files let the point exporter read the features in bulk
+            input_dataset = None
+            if input_source is not None and not passthrough_args and not filters and not reprojecting and not delta_mode:
+                source_definition = parameters.get(self.INPUT_LAYER)
+                if not isinstance(source_definition, QgsProcessingFeatureSourceDefinition):
+                    source_definition = None
+                dataset_path, dataset_layer, _ = ogr_file_dataset(
+                    self.parameterAsVectorLayer(parameters, self.INPUT_LAYER, context), source_definition)
+                if dataset_path:
+                    input_dataset = (dataset_path, dataset_layer)
+
+            # Feed the input through a named pipe so FME reads while QGIS is still exporting
+            use_input_pipe = (input_source is not None and not passthrough_args
+                              and self.parameterAsBoolean(parameters, self.PIPE_INPUT, context))
+            if use_input_pipe and not pipes_supported():
+                feedback.pushWarning("Named pipe transport is only available on Linux, exporting to a file instead.")
+                use_input_pipe = False
+            elif use_input_pipe and exchange_format['fme_format'] != 'GEOJSON':
+                feedback.pushWarning("Named pipe transport needs the GeoJSON exchange format, exporting to a file instead.")
+                use_input_pipe = False
+            use_output_pipe = self.parameterAsBoolean(parameters, self.PIPE_OUTPUT, context)
+            if use_output_pipe and not pipes_supported():
+                feedback.pushWarning("Named pipe transport is only available on Linux, reading the output from a file instead.")
+                use_output_pipe = False
+            elif use_output_pipe and exchange_format['fme_format'] != 'GEOJSON':
+                feedback.pushWarning("Named pipe transport needs the GeoJSON exchange format, reading the output from a file instead.")
+                use_output_pipe = False
+            elif use_output_pipe and delta_mode:
+                feedback.pushWarning("Delta mode merges the output with the previous run, reading the output from a file instead.")
+                use_output_pipe = False
+
+            # Allocate the exchange files in a run directory, in RAM when they fit. Only the files this
+            # run writes there count: a passed through, piped or cached input and a piped output do not
+            exchange_size = estimate_exchange_size(input_source, exchange_format) if input_source is not None else 0
+            cache_input = self.parameterAsBoolean(parameters, self.CACHE_EXPORT, context) and not delta_mode
+            run_size = sum(estimate_exchange_size(layer, exchange_format)
+                           for layer in self.parameterAsLayerList(parameters, self.INPUT_LAYERS, context))
+            if input_source is not None and not passthrough_args and not use_input_pipe and not cache_input:
+                run_size += exchange_size
+            if not use_output_pipe:
+                # The output is assumed to be about the size of the input
+                run_size += exchange_size
+            temp_dir, tier = exchange_directory(run_size)
+            reference_output = self.parameterAsBoolean(parameters, self.REFERENCE_OUTPUT, context)
+            if reference_output and tier == 'memory':
+                # A referenced output outlives the run, keep it off the RAM-backed directory
+                temp_dir, tier = exchange_settings()['spill_dir'], 'disk'
+            run = ExchangeRun(temp_dir, run_size, feedback=feedback)
+            if run.base_dir != temp_dir:
+                temp_dir, tier = run.base_dir, 'disk'
+            feedback.pushInfo(f"Exchange files in {run.path} ({tier} tier, estimated {run_size / 1048576:.1f} MB)")
+            input_path = run.allocate('fme_input', exchange_format['extension'])
+            output_path = run.allocate('fme_output', exchange_format['extension'])
+
+            # Compress the exchange input, harder the slower the exchange directory writes
+            input_format = exchange_format
+            if (self.parameterAsBoolean(parameters, self.COMPRESS_EXCHANGE, context)
+                    and input_source is not None and not passthrough_args and not use_input_pipe):
+                if exchange_format['driver'] != 'GeoJSON':
+                    feedback.pushWarning("Compressed exchange needs the GeoJSON exchange format, writing uncompressed input.")
+                else:
+                    throughput = directory_throughput(temp_dir)
+                    input_format = with_compression(exchange_format, compression_level(throughput))
+                    input_path = run.allocate('fme_input', input_format['extension'])
+                    feedback.pushInfo(f"Exchange directory writes {throughput:.0f} MB/s, "
+                                      f"compressing input with gzip level {input_format['compression_level']}")
+
+            # Work out which input fields actually have to travel through FME
+            export_fields = None
+            restorer = None
+            if input_source is not None and not passthrough_args:
+                source_names = input_source.fields().names()
+                export_fields = self.parameterAsFields(parameters, self.FIELDS, context) or None
+                if export_fields is None and self.parameterAsBoolean(parameters, self.PROJECT_FIELDS, context):
+                    generic = _generic_attribute_transformers(_workspace_path(cmd_list))
+                    if generic:
+                        feedback.pushWarning(f"The workspace uses {', '.join(generic)}, which can read attributes "
+                                             f"it does not name; all fields are exported.")
+                    else:
+                        export_fields = _workspace_field_references(_workspace_path(cmd_list), source_names)
+                if export_fields is not None and len(set(export_fields) & set(source_names)) < len(source_names):
+                    dropped = [name for name in source_names if name not in export_fields]
+                    restorer = AttributeRestorer(input_source, dropped, feedback)
+                    feedback.pushInfo(f"Exporting {len(source_names) - len(dropped)} of {len(source_names)} fields, "
+                                      f"re-attaching {', '.join(dropped)} on import")
+                else:
+                    export_fields = None
+
+            # Delta mode: compare feature hashes with the previous run and only export the changes
+            delta_state = None
+            if delta_mode:
+                if export_fields is None:
+                    # The join key is needed to match FME's output to the input features
+                    export_fields = input_source.fields().names()
+                    restorer = AttributeRestorer(input_source, [], feedback)
+                input_layer = self.parameterAsVectorLayer(parameters, self.INPUT_LAYER, context)
+                tokens = [change_token(layer) for layer in self.parameterAsLayerList(parameters, self.INPUT_LAYERS, context)]
+                delta_state = DeltaState(delta_key(cmd_list, input_layer, feature_request, export_fields,
+                                                   exchange_format, tokens))
+                hashes = feature_hashes(input_source, feature_request, feedback)
+                if feedback.isCanceled():
+                    raise QgsProcessingException("Comparing the input with the previous run was canceled.")
+                previous = None if self.parameterAsBoolean(parameters, self.FULL_REFRESH, context) else delta_state.load()
+                if previous is None:
+                    delta_state.clear()
+                    changed, deleted = sorted(hashes), set()
+                    feedback.pushInfo(f"Delta mode: full run over {len(changed)} features")
+                else:
+                    changed, deleted = delta_plan(hashes, previous)
+                    feedback.pushInfo(f"Delta mode: {len(changed)} inserted or modified, {len(deleted)} deleted, "
+                                      f"{len(hashes) - len(changed)} unchanged features")
+                replaced = set(changed) | deleted
+                if previous is not None and not changed:
+                    # Nothing for FME to do, the output of the previous run only loses deleted features
+                    feedback.pushInfo("No inserted or modified features, reusing the output of the previous run without running FME")
+                    output_layers = [delta_state.update([], replaced, hashes, context.transformContext(), feedback)]
+                    results = self._import_output(parameters, context, feedback, output_layers, exchange_format,
+                                                  restorer, True, "FME was not run, no inserted or modified features.")
+                    output_layers = None
+                    return results
+                if previous is not None:
+                    feature_request.setFilterFids(changed)
+
+            # Let the workspace writer write the GeoPackage output itself, moved into place after success
+            direct_args = direct_dataset = None
+            if self.parameterAsBoolean(parameters, self.DIRECT_WRITE, context):
+                destination = self.parameterAsOutputLayer(parameters, self.OUTPUT_LAYER, context)
+                if restorer is not None or delta_state is not None:
+                    reason = 'the output needs re-attached attributes or a delta merge'
+                else:
+                    direct_dataset = run.allocate('fme_direct_output', 'gpkg')
+                    direct_args, reason = direct_write_dataset(destination, workspace_datasets, direct_dataset)
+                if direct_args:
+                    feedback.pushInfo(f"Direct write: {reason}, skipping the copy stage")
+                    use_output_pipe = False
+                else:
+                    feedback.pushInfo(f"Direct write not possible ({reason}), copying the output into the sink")
+
+            # Have FME write one file or table per feature type, each loaded into its own sink
+            split_output = self.parameterAsBoolean(parameters, self.SPLIT_FEATURE_TYPES, context)
+            if split_output and (delta_state is not None or direct_args):
+                feedback.pushWarning("One output layer per feature type is not available with delta mode or direct write.")
+                split_output = False
+            writer_feature_types = []
+            if split_output:
+                use_output_pipe = False
+                writer = next((d for d in workspace_datasets if d.get('PARAMETER') == dest_parameter), {})
+                writer_feature_types = _workspace_feature_types(_workspace_path(cmd_list), writer.get('KEYWORD'))
+                if not exchange_format['multi_layer']:
+                    # A folder dataset makes the writer write a file per feature type
+                    output_path = os.path.join(run.path, 'fme_output')
+                    os.makedirs(output_path)
+
+            # Return FME's output file itself when no import stage has to touch the features
+            if reference_output and (restorer is not None or delta_state is not None or direct_args or split_output
+                                     or any(parameters.get(name) for name in
+                                            (self.OUTPUT_POINTS, self.OUTPUT_LINES, self.OUTPUT_POLYGONS))):
+                feedback.pushWarning("The output cannot be returned by reference when attributes are re-attached, in delta "
+                                     "mode, with direct write or with split outputs; copying it into the output layer.")
+                reference_output = False
+            if reference_output:
+                use_output_pipe = False
+
+            # Roll the input over to a new exchange file every N features, MB are converted
+            # to features with the estimated size per feature
+            rollover_features = self.parameterAsInt(parameters, self.ROLLOVER_FEATURES, context)
+            rollover_mb = self.parameterAsInt(parameters, self.ROLLOVER_MB, context)
+            if rollover_mb > 0 and input_source is not None and exchange_size > 0:
+                bytes_per_feature = exchange_size / max(1, input_source.featureCount())
+                mb_features = max(1, int(rollover_mb * 1024 * 1024 / bytes_per_feature))
+                rollover_features = min(rollover_features, mb_features) if rollover_features > 0 else mb_features
+            if rollover_features > 0 and (passthrough_args or use_input_pipe):
+                feedback.pushWarning("Input is passed through or streamed through a pipe, it is not split into several files.")
+            elif rollover_features > 0 and input_source is not None and input_source.featureCount() > rollover_features:
+                feedback.pushInfo(f"Starting a new exchange file every {rollover_features} features")
+
+            # Export the additional input layers, one workspace reader each. Single-layer formats are
+            # written concurrently, one file per layer; multi-layer formats get one table per layer in
+            # a shared file, written after the main input since SQLite takes one writer at a time.
+            extra_inputs = []
+            extra_futures = []
+            extra_layers = self.parameterAsLayerList(parameters, self.INPUT_LAYERS, context)
+            if extra_layers:
+                main_layer = self.parameterAsVectorLayer(parameters, self.INPUT_LAYER, context)
+                table_names = {exchange_table_name(main_layer.name() if main_layer else None)}
+                reader_parameters = [d['PARAMETER'] for d in workspace_datasets
+                                     if d.get('ROLE') == 'READER' and d.get('PARAMETER')
+                                     and d.get('FORMAT', '').upper() == exchange_format['fme_format']
+                                     and d['PARAMETER'] != source_parameter]
+                mapping = _parse_input_mapping(self.parameterAsString(parameters, self.INPUT_MAPPING, context))
+                for layer, parameter in _map_input_layers(extra_layers, reader_parameters, mapping):
+                    if parameter is None:
+                        feedback.pushWarning(f"No workspace reader left for input layer {layer.name()}, it is not exported.")
+                        continue
+                    path = table_name = None
+                    if exchange_format['multi_layer']:
+                        table_name = exchange_table_name(layer.name())
+                        while table_name in table_names:
+                            table_name = f'{exchange_table_name(layer.name())}_{len(table_names)}'
+                        table_names.add(table_name)
+                    else:
+                        path = run.allocate(f'fme_input_{len(extra_inputs) + 1}', input_format['extension'])
+                    extra_inputs.append((parameter, QgsVectorLayerFeatureSource(layer), path, table_name))
+                    feedback.pushInfo(f"Input layer {layer.name()} is read by {parameter}")
+                if extra_inputs and not exchange_format['multi_layer']:
+                    extra_executor = ThreadPoolExecutor(max_workers=len(extra_inputs))
+                    extra_futures = [extra_executor.submit(export_source, source, path, input_format,
+                                                           context.transformContext(), BackgroundFeedback(feedback),
+                                                           layer_name=table_name)
+                                     for _, source, path, table_name in extra_inputs]
+
+            # The pass-through, additional input and direct-write datasets are supplied by the run as well
+            supplied = [parameter for parameter, _, _, _ in extra_inputs]
+            for arguments in (passthrough_args, direct_args):
+                if arguments:
+                    supplied.extend(option[2:] for option in arguments[0::2])
+            cmd_list = _strip_dataset_arguments(cmd_list, supplied)
+
+            # Stream the input features straight into the exchange file
+            producer = None
+            exported_paths = None
+            if passthrough_args:
+                cmd_list.extend(passthrough_args)
+            elif use_input_pipe:
+                os.mkfifo(input_path)
+                cmd_list.extend([f'--{source_parameter}', input_path])
+
+                def producer(process):
+                    feedback.pushInfo(f"Streaming {input_source.featureCount()} input features through {input_path}")
+                    try:
+                        with open_pipe_writer(input_path, process, feedback) as stream:
+                            write_geojson(stream, input_source, context.transformContext(), feedback,
+                                          feature_request, coordinate_precision=coordinate_precision,
+                                          drop_nulls=drop_nulls, attributes=export_fields,
+                                          dataset=input_dataset, rfc7946=rfc7946)
+                    except BrokenPipeError:
+                        feedback.pushWarning("FME closed the input pipe before all features were written.")
+            elif input_source is not None:
+                input_layer = self.parameterAsVectorLayer(parameters, self.INPUT_LAYER, context)
+                table_name = None
+                if exchange_format['multi_layer']:
+                    table_name = exchange_table_name(input_layer.name() if input_layer else None)
+
+                # No more threads than this machine has processors
+                export_threads = min(self.parameterAsInt(parameters, self.EXPORT_THREADS, context),
+                                     os.cpu_count() or 1)
+
+                # Look the export up in the cache before exporting the layer again
+                export_cache = cache_key = input_paths = None
+                if self.parameterAsBoolean(parameters, self.CACHE_EXPORT, context) and delta_state is None:
+                    source_definition = parameters.get(self.INPUT_LAYER)
+                    if not isinstance(source_definition, QgsProcessingFeatureSourceDefinition):
+                        source_definition = None
+                    cache_key, reason = export_cache_key(
+                        input_layer, source_definition, feature_request, export_fields, input_format,
+                        rollover_features, export_threads)
+                    if cache_key:
+                        export_cache = ExportCache()
+                        input_paths = export_cache.lookup(cache_key)
+                        if input_paths:
+                            feedback.pushInfo(f"Export cache hit ({reason}), reusing {', '.join(input_paths)}")
+                    else:
+                        feedback.pushInfo(f"Export cache not used ({reason})")
+
+                if not input_paths:
+                    export_path = input_path
+                    staging_dir = None
+                    if export_cache is not None:
+                        staging_dir = export_cache.reserve()
+                        export_path = os.path.join(staging_dir, os.path.basename(input_path))
+                    feedback.pushInfo(f"Exporting {input_source.featureCount()} input features to {export_path}")
+                    try:
+                        input_paths = export_source_sharded(
+                            input_source, export_path, input_format, context.transformContext(), feedback,
+                            feature_request, layer_name=table_name, attributes=export_fields,
+                            threads=export_threads,
+                            dataset=input_dataset, max_features=rollover_features)
+                        if feedback.isCanceled():
+                            raise QgsProcessingException("Export of the input layer was canceled.")
+                    except Exception:
+                        if staging_dir is not None:
+                            export_cache.discard(staging_dir)
+                        raise
+                    if staging_dir is not None:
+                        input_paths = export_cache.commit(cache_key, staging_dir, input_paths)
+                    else:
+                        exported_paths = input_paths
+                cmd_list.extend([f'--{source_parameter}', fme_dataset_list(input_paths)])
+
+            # Add the additional inputs as tables of the input file when it was written by this run
+            if extra_inputs and exchange_format['multi_layer']:
+                shared_path = input_path if exported_paths == [input_path] else \
+                    run.allocate('fme_inputs', input_format['extension'])
+                for index, (parameter, source, _, table_name) in enumerate(extra_inputs):
+                    if feedback.isCanceled():
+                        break
+                    feedback.pushInfo(f"Writing table {table_name} of {shared_path}")
+                    export_source(source, shared_path, input_format, context.transformContext(),
+                                  BackgroundFeedback(feedback), layer_name=table_name)
+                    extra_inputs[index] = (parameter, source, shared_path, table_name)
+
+            # Wait for the additional inputs exported meanwhile
+            for index, (parameter, _, path, _) in enumerate(extra_inputs):
+                if extra_futures:
+                    extra_futures[index].result()
+                cmd_list.extend([f'--{parameter}', path])
+            if feedback.isCanceled():
+                raise QgsProcessingException("Export of the input layers was canceled.")
+
+            # Append the output dataset parameter to the list
+            if direct_args:
+                cmd_list.extend(direct_args)
+            else:
+                cmd_list.extend([f'--{dest_parameter}', output_path])
+
+            # Fill the sink from the output pipe while FME is still writing
+            consumer = None
+            streamed = {}
+            if use_output_pipe:
+                os.mkfifo(output_path)
+
+                def create_sink(fields, wkb_type, crs):
+                    sink, dest_id = self.parameterAsSink(parameters, self.OUTPUT_LAYER, context, fields, wkb_type, crs)
+                    geometry_sinks, streamed['geometry_ids'] = self._geometry_type_sinks(
+                        parameters, context, fields, QgsWkbTypes.hasZ(wkb_type), crs)
+                    if geometry_sinks:
+                        sink = streamed['router'] = GeometryTypeSinks(geometry_sinks, sink)
+                    return sink, dest_id
+
+                def consumer(process):
+                    with open_pipe_reader(output_path, process, feedback) as stream:
+                        streamed['sink'], streamed['dest_id'], streamed['count'] = import_geojson_stream(
+                            stream, create_sink, feedback, exchange_format['read_batch_size'], restorer,
+                            input_source.featureCount() if input_source is not None else 0)
             
             feedback.pushInfo(f"Running FME command: {' '.join(cmd_list)}") # Log the reconstructed command for info
             # Run the command as a list, without shell=True
-            _kwargs = {'capture_output': True, 'text': True, 'check': False}
-            if sys.platform == 'win32':
-                _kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
-            result = subprocess.run(cmd_list, **_kwargs) # check=False to handle errors manually
+            try:
+                result = run_fme(cmd_list, feedback, producer, consumer) # non-zero exit codes are handled below
+            finally:
+                if use_input_pipe and os.path.exists(input_path):
+                    os.remove(input_path)
+                if use_output_pipe and os.path.exists(output_path):
+                    os.remove(output_path)
+            if feedback.isCanceled():
+                raise QgsProcessingException("The FME run was canceled.")
             
             feedback.pushInfo(result.stdout)
             if result.returncode != 0:
@@ -445,33 +1280,217 @@ class QGISFMEFormAlgorithmAlgorithm(QgsProcessingAlgorithm):
             elif result.stderr: # Log stderr even if return code is 0, as FME might put warnings there
                 feedback.pushWarning(f"FME process generated warnings/errors on stderr:\n{result.stderr}")
                 QgsMessageLog.logMessage(f"FME stderr output:\n{result.stderr}", "FME Connector", level=Qgis.Warning)
+            if delta_state is not None and result.returncode != 0:
+                # A partial output must not become the base of the next delta run
+                delta_state.clear()
+                raise QgsProcessingException("FME failed in delta mode, the next run processes all features again.")
+
+            if direct_args:
+                # FME wrote the final output, hand it back without copying
+                if result.returncode != 0:
+                    # A failed or partial run must not replace the existing destination
+                    raise QgsProcessingException(f"FME failed with exit code {result.returncode}, "
+                                                 f"{destination} was left unchanged.")
+                if not QgsVectorLayer(direct_dataset, "FME Output", "ogr").isValid():
+                    QgsMessageLog.logMessage(f"FME output could not be loaded from {direct_dataset}. FME log was:\n{result.stdout}", "FME Connector", level=Qgis.Critical)
+                    raise QgsProcessingException("FME output could not be loaded. See log for details.")
+                written = direct_write_output(destination, direct_dataset)
+                context.addLayerToLoadOnCompletion(written, QgsProcessingContext.LayerDetails(
+                    os.path.splitext(os.path.basename(written))[0], context.project(), self.OUTPUT_LAYER))
+                feedback.pushInfo(f"FME wrote the output directly to {written}")
+                return {self.OUTPUT_LAYER: written, self.OUTPUT_TEXT: result.stdout}
             
-
-            # Load output GeoJSON as layer
-            output_layer = QgsVectorLayer(output_geojson, "FME Output", "ogr")
-            if not output_layer.isValid():
-                QgsMessageLog.logMessage(f"FME output could not be loaded from {output_geojson}. FME log was:\n{result.stdout}", "FME Connector", level=Qgis.Critical)
+            if use_output_pipe:
+                dest_id = streamed.get('dest_id')
+                if dest_id is None:
+                    # FME wrote no features, still hand back an (empty) output layer
+                    (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT_LAYER, context, QgsFields(),
+                                                           QgsWkbTypes.NoGeometry, QgsCoordinateReferenceSystem())
+                feedback.pushInfo(f"Imported {streamed.get('count', 0)} features from the FME output pipe")
+                if 'router' in streamed:
+                    self._report_geometry_types(streamed['router'], feedback)
+                return {self.OUTPUT_LAYER: dest_id, self.OUTPUT_TEXT: result.stdout, **streamed.get('geometry_ids', {})}
+
+            if reference_output:
+                output_paths = output_datasets(output_path, exchange_format)
+                if len(output_paths) == 1 and QgsVectorLayer(output_paths[0], "FME Output", "ogr").isValid():
+                    kept = run.keep(output_paths[0])
+                    context.addLayerToLoadOnCompletion(kept, QgsProcessingContext.LayerDetails(
+                        "FME Output", context.project(), self.OUTPUT_LAYER))
+                    feedback.pushInfo(f"Returning the FME output by reference: {kept}")
+                    return {self.OUTPUT_LAYER: kept, self.OUTPUT_TEXT: result.stdout}
+                feedback.pushWarning(f"The FME output is not a single loadable file ({len(output_paths)} files), "
+                                     f"copying it into the output layer instead of returning it by reference.")
+
+            if split_output:
+                if any(parameters.get(name) for name in (self.OUTPUT_POINTS, self.OUTPUT_LINES, self.OUTPUT_POLYGONS)):
+                    feedback.pushWarning("Point, line and polygon outputs are not filled when splitting by feature type.")
+                dest_ids = self._import_feature_types(parameters, context, feedback, output_path, exchange_format,
+                                                      restorer, writer_feature_types)
+                return {self.OUTPUT_LAYER: dest_ids[0], self.OUTPUT_LAYERS: dest_ids, self.OUTPUT_TEXT: result.stdout}
+
+            # Load every output exchange file FME wrote as layer
+            output_paths = output_datasets(output_path, exchange_format)
+            output_layers = [QgsVectorLayer(path, "FME Output", "ogr") for path in output_paths]
+            if not output_layers or not all(layer.isValid() for layer in output_layers):
+                QgsMessageLog.logMessage(f"FME output could not be loaded from {output_path}. FME log was:\n{result.stdout}", "FME Connector", level=Qgis.Critical)
                 raise QgsProcessingException("FME output could not be loaded. See log for details.")
-
-            # Create the output sink based on FME output layer's schema
-            (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT_LAYER, context,
-                                                   output_layer.fields(),
-                                                   output_layer.wkbType(),
-                                                   output_layer.sourceCrs())
-            for f in output_layer.getFeatures():
-                sink.addFeature(f, QgsFeatureSink.FastInsert)
-
-            # Optionally, clean up temp files (uncomment if desired)
-            # os.remove(input_geojson)
-            # os.remove(output_geojson)
-
-            QgsMessageLog.logMessage(f"Returning OUTPUT_LAYER sink id: {dest_id}", "FME Connector", level=Qgis.Info)
-            QgsMessageLog.logMessage(f"Returning OUTPUT_TEXT log (length {len(result.stdout)} chars)", "FME Connector", level=Qgis.Info)
-            # Return the sink ID for OUTPUT_LAYER (for chaining), and log for OUTPUT_TEXT
-            return {self.OUTPUT_LAYER: dest_id, self.OUTPUT_TEXT: result.stdout}
+            if len(output_layers) > 1:
+                feedback.pushInfo(f"Merging {len(output_layers)} output files FME wrote: {', '.join(output_paths)}")
+            if exchange_format['multi_layer']:
+                for path, output_layer in zip(output_paths, output_layers):
+                    output_tables = sublayer_names(output_layer)
+                    if len(output_tables) > 1:
+                        feedback.pushWarning(f"FME wrote {len(output_tables)} tables ({', '.join(output_tables)}) "
+                                             f"to {path}, only the first one is loaded into the output layer.")
+
+            # Merge the output of the changed features into the output of the previous run
+            if delta_state is not None:
+                output_layers = [delta_state.update(output_layers, replaced, hashes,
+                                                    context.transformContext(), feedback)]
+
+            results = self._import_output(parameters, context, feedback, output_layers, exchange_format, restorer,
+                                          delta_state is not None, result.stdout)
+            # Release the output files so the run directory can be removed
+            output_layers = None
+            return results
         except Exception as e:
             QgsMessageLog.logMessage(f"Error in processAlgorithm: {str(e)}\n\nTraceback:\n{traceback.format_exc()}", "FME Connector", level=Qgis.Info)
             raise e
+        finally:
+            # Exchange files are removed on success, failure and cancel alike
+            if extra_executor is not None:
+                extra_executor.shutdown(wait=True, cancel_futures=True)
+            if run is not None:
+                run.close()
+
+    def _import_output(self, parameters, context, feedback, output_layers, exchange_format, restorer, stored, log):
+        """Copy FME's output layers into OUTPUT_LAYER and the point, line and polygon outputs.
+
+        ``stored`` is set for the merged output of a delta run, whose primary
+        key is left out of the output fields. ``log`` is returned as OUTPUT_TEXT.
+        """
+        # Create the output sink based on the merged schema of FME's output layers
+        merged_fields, output_wkb_type, output_crs = merged_schema(output_layers)
+        if stored:
+            merged_fields = stored_fields(merged_fields)
+        output_fields = merged_fields if restorer is None else restorer.fields(merged_fields)
+        (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT_LAYER, context,
+                                               output_fields,
+                                               output_wkb_type,
+                                               output_crs)
+        # Route the features into the point, line and polygon outputs that were asked for
+        has_z = any(QgsWkbTypes.hasZ(layer.wkbType()) for layer in output_layers)
+        geometry_sinks, geometry_ids = self._geometry_type_sinks(parameters, context, output_fields, has_z, output_crs)
+        router = None
+        if geometry_sinks:
+            sink = router = GeometryTypeSinks(geometry_sinks, sink)
+        # Import in batches, reporting progress per output file
+        import_feedback = QgsProcessingMultiStepFeedback(len(output_layers), feedback)
+        imported = 0
+        for step, output_layer in enumerate(output_layers):
+            import_feedback.setCurrentStep(step)
+            imported += import_layer(output_layer, sink, exchange_format['read_batch_size'], restorer,
+                                     merged_fields, import_feedback)
+            if feedback.isCanceled():
+                raise QgsProcessingException("Import of the FME output was canceled.")
+        feedback.pushInfo(f"Imported {imported} features from the FME output")
+        if router is not None:
+            self._report_geometry_types(router, feedback)
+        # Release the output files so the run directory can be removed
+        output_layer = sink = router = geometry_sinks = None
+
+        QgsMessageLog.logMessage(f"Returning OUTPUT_LAYER sink id: {dest_id}", "FME Connector", level=Qgis.Info)
+        QgsMessageLog.logMessage(f"Returning OUTPUT_TEXT log (length {len(log)} chars)", "FME Connector", level=Qgis.Info)
+        # Return the sink ID for OUTPUT_LAYER (for chaining), and log for OUTPUT_TEXT
+        return {self.OUTPUT_LAYER: dest_id, self.OUTPUT_TEXT: log, **geometry_ids}
+
+    def _geometry_type_sinks(self, parameters, context, fields, has_z, crs):
+        """Create the point, line and polygon sinks the user asked for.
+
+        :return: Tuple (sinks, results), sinks maps QgsWkbTypes geometry types
+            to sinks for GeometryTypeSinks, results maps the output names to
+            the destination ids.
+        """
+        sinks = {}
+        results = {}
+        for name, geometry_type, wkb_type in (
+                (self.OUTPUT_POINTS, QgsWkbTypes.PointGeometry, QgsWkbTypes.MultiPoint),
+                (self.OUTPUT_LINES, QgsWkbTypes.LineGeometry, QgsWkbTypes.MultiLineString),
+                (self.OUTPUT_POLYGONS, QgsWkbTypes.PolygonGeometry, QgsWkbTypes.MultiPolygon)):
+            if has_z:
+                wkb_type = QgsWkbTypes.addZ(wkb_type)
+            (sink, dest_id) = self.parameterAsSink(parameters, name, context, fields, wkb_type, crs)
+            if sink is not None:
+                sinks[geometry_type] = sink
+                results[name] = dest_id
+        return sinks, results
+
+    def _report_geometry_types(self, router, feedback):
+        """Log how many features went to each geometry type output."""
+        labels = {QgsWkbTypes.PointGeometry: 'points', QgsWkbTypes.LineGeometry: 'lines',
+                  QgsWkbTypes.PolygonGeometry: 'polygons'}
+        feedback.pushInfo("Split by geometry type: " + ', '.join(
+            f"{count} {labels[geometry_type]}" for geometry_type, count in router.counts.items()))
+
+    def _import_feature_types(self, parameters, context, feedback, output_path, exchange_format, restorer,
+                              declared):
+        """Fill one sink per writer feature type from FME's output, the sinks in parallel.
+
+        The declared feature types come first, in workspace order, followed by
+        any other feature type found in the output. The first one is written to
+        OUTPUT_LAYER, the others to temporary layers loaded on completion.
+
+        :return: List of the sink destination ids, one per feature type.
+        """
+        groups = output_feature_types(output_datasets(output_path, exchange_format), exchange_format)
+        if not all(layer.isValid() for layers in groups.values() for layer in layers):
+            raise QgsProcessingException(f"FME output could not be loaded from {output_path}.")
+        names = list(declared) + [name for name in groups if name not in declared]
+        if not names:
+            raise QgsProcessingException("FME wrote no output feature types. See log for details.")
+
+        jobs = []
+        dest_ids = []
+        for index, name in enumerate(names):
+            layers = groups.get(name, [])
+            if layers:
+                fields, wkb_type, crs = merged_schema(layers)
+            else:
+                feedback.pushWarning(f"FME wrote no features of feature type {name}")
+                fields, wkb_type, crs = QgsFields(), QgsWkbTypes.NoGeometry, QgsCoordinateReferenceSystem()
+            # Each sink maps its own fields to the restored ones
+            type_restorer = copy.copy(restorer) if restorer is not None else None
+            sink_fields = fields if type_restorer is None else type_restorer.fields(fields)
+            if index == 0:
+                (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT_LAYER, context,
+                                                       sink_fields, wkb_type, crs)
+            else:
+                file_name = re.sub(r'[^\w.-]', '_', name)
+                destination = QgsProcessingUtils.generateTempFilename(f'{file_name}.gpkg')
+                (sink, dest_id) = QgsProcessingUtils.createFeatureSink(destination, context,
+                                                                      sink_fields, wkb_type, crs)
+                context.addLayerToLoadOnCompletion(dest_id, QgsProcessingContext.LayerDetails(
+                    name, context.project(), self.OUTPUT_LAYERS))
+            dest_ids.append(dest_id)
+            # The workers read feature sources made here, never the layers themselves
+            jobs.append((sink, [LayerSnapshot(layer) for layer in layers], type_restorer, fields))
+
+        def fill(sink, layers, type_restorer, fields):
+            return sum(import_layer(layer, sink, exchange_format['read_batch_size'], type_restorer, fields,
+                                    BackgroundFeedback(feedback)) for layer in layers)
+
+        # Restoring reads the input source, which is not shared between threads
+        with ThreadPoolExecutor(max_workers=1 if restorer is not None else len(jobs)) as executor:
+            futures = [executor.submit(fill, *job) for job in jobs]
+            for done, (name, future) in enumerate(zip(names, futures), 1):
+                feedback.pushInfo(f"Imported {future.result()} features of feature type {name}")
+                feedback.setProgress(int(done * 100 / len(futures)))
+        if feedback.isCanceled():
+            raise QgsProcessingException("Import of the FME output was canceled.")
+        # Release the sinks and output files so the run directory can be removed
+        jobs = groups = None
+        return dest_ids
 
 class FMEFileLister(QWidget):
     INI_FILENAME = 'fme_settings.ini'
@@ -547,6 +1566,8 @@ class FMEFileLister(QWidget):
         self.selected_directory = ""
         self.temp_input_path = None
         self.temp_output_path = None
+        self.source_dataset_parameter = 'SourceDataset_GEOJSON'
+        self.dest_dataset_parameter = 'DestDataset_GEOJSON'
         self.fme_exe_path = None
         self.fmeworkbench_exe_path = None  # Store user-selected workbench path for session
         self.setLayout(self.build_ui())
@@ -972,6 +1993,15 @@ class FMEFileLister(QWidget):
                                 self.user_parameters_table.setItem(row, 0, QTableWidgetItem(param_name))
                                 self.user_parameters_table.setItem(row, 1, QTableWidgetItem(param_value if param_value else ""))
 
+                    # Name the dataset parameters after the workspace's own reader and writer
+                    datasets = _workspace_datasets(fmw_path)
+                    self.source_dataset_parameter = next(
+                        (d['PARAMETER'] for d in datasets if d['ROLE'] == 'READER' and d['PARAMETER']),
+                        'SourceDataset_GEOJSON')
+                    self.dest_dataset_parameter = next(
+                        (d['PARAMETER'] for d in datasets if d['ROLE'] == 'WRITER' and d['PARAMETER']),
+                        'DestDataset_GEOJSON')
+
                     # Update dataset paths AFTER tables are populated
                     self.update_dataset_paths()
                     
@@ -1019,11 +2049,11 @@ class FMEFileLister(QWidget):
 
             command_parts = [f'"{fme_path}" "{workspace_path}"']
             
-            # Add dataset parameters if available
+            # Add dataset parameters if available, named after the workspace reader/writer
             if hasattr(self, 'temp_input_path') and self.temp_input_path:
-                command_parts.append(f'--SourceDataset_GEOJSON "{self.temp_input_path}"')
+                command_parts.append(f'--{self.source_dataset_parameter} "{self.temp_input_path}"')
             if hasattr(self, 'temp_output_path') and self.temp_output_path:
-                command_parts.append(f'--DestDataset_GEOJSON "{self.temp_output_path}"')
+                command_parts.append(f'--{self.dest_dataset_parameter} "{self.temp_output_path}"')
             
             # Add user parameters
             for row in range(self.user_parameters_table.rowCount()):
@@ -1075,8 +2105,9 @@ class FMEFileLister(QWidget):
             self.fme_exe_path = path_to_save  # Update instance variable
             
             config = configparser.ConfigParser()
-            config[self.INI_SECTION] = {self.INI_KEY: path_to_save}
             ini_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.INI_FILENAME)
+            config.read(ini_path)  # keep the other sections, e.g. the exchange settings
+            config[self.INI_SECTION] = {self.INI_KEY: path_to_save}
             with open(ini_path, 'w') as configfile:
                 config.write(configfile)
             QMessageBox.information(self, "Path Saved", f"FME executable path has been saved as default:\n{path_to_save}")
@@ -1103,15 +2134,13 @@ class FMEFileLister(QWidget):
     def update_dataset_paths(self):
         """Update the source and destination dataset paths with the correct filename format"""
         try:
-            # Generate unique filenames
-            input_filename, output_filename = self.generate_filename_pair()
+            # Generate unique filenames with the extension of the workspace's exchange format
+            exchange_format = exchange_format_for_parameter(self.source_dataset_parameter)
+            extension = exchange_format['extension'] if exchange_format else 'geojson'
+            input_filename, output_filename = self.generate_filename_pair(extension)
             
-            # Get QGIS temp folder using settings directory
-            from qgis.core import QgsApplication
-            temp_folder = os.path.join(QgsApplication.qgisSettingsDirPath(), "temp")
-            # Ensure temp_folder exists
-            if not os.path.exists(temp_folder):
-                os.makedirs(temp_folder)
+            # Use the same exchange location as the algorithm runs
+            temp_folder, _ = exchange_directory()
             
             # Create full paths using os.path.join for cross-platform compatibility
             input_path = os.path.join(temp_folder, input_filename)
@@ -1135,41 +2164,20 @@ class FMEFileLister(QWidget):
         """Load the FME output file into QGIS with a creative layer name."""
         pass
 
-    def generate_filename_pair(self):
-        """Generate a pair of input/output filenames with the format YYYYMMDD_xxxxx_line2_[input/output].geojson"""
+    def generate_filename_pair(self, extension='geojson'):
+        """Generate a pair of input/output filenames with the format YYYYMMDD_<uuid>_line2_[input/output].<extension>"""
         from datetime import datetime
-        import random
-        import string
-        import os
-        from qgis.core import QgsApplication
+        import uuid
 
         # Get current date in YYYYMMDD format
         current_date = datetime.now().strftime("%Y%m%d")
         
-        # Get QGIS temp folder
-        temp_folder = QgsApplication.qgisSettingsDirPath() + "temp/"
-        os.makedirs(temp_folder, exist_ok=True)
+        # A uuid makes the name unique without probing the folder
+        base_filename = f"{current_date}_{uuid.uuid4().hex}_line2"
         
-        # Generate random chars until we get a unique one
-        while True:
-            # Generate 5 random lowercase alphanumeric characters
-            chars = string.ascii_lowercase + string.digits
-            random_chars = ''.join(random.choice(chars) for _ in range(5))
-            
-            # Create base filename
-            base_filename = f"{current_date}_{random_chars}_line2"
-            
-            # Generate input and output filenames
-            input_filename = f"{base_filename}_input.geojson"
-            output_filename = f"{base_filename}_output.geojson"
-            
-            # Check if files already exist in the temp directory
-            input_path = os.path.join(temp_folder, input_filename)
-            output_path = os.path.join(temp_folder, output_filename)
-            
-            # If neither file exists, we can use these names
-            if not os.path.exists(input_path) and not os.path.exists(output_path):
-                break
+        # Generate input and output filenames
+        input_filename = f"{base_filename}_input.{extension}"
+        output_filename = f"{base_filename}_output.{extension}"
         
         return input_filename, output_filename
 
@@ -1183,6 +2191,8 @@ class FMEFileLister(QWidget):
         self.selected_directory = ""
         self.temp_input_path = None
         self.temp_output_path = None
+        self.source_dataset_parameter = 'SourceDataset_GEOJSON'
+        self.dest_dataset_parameter = 'DestDataset_GEOJSON'
         self.fme_exe_path = None
         self.fmeworkbench_exe_path = None  # Store user-selected workbench path for session
         self.setLayout(self.build_ui())
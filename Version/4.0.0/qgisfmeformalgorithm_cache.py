@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Cache of exported input layers.
+# Repeated runs on an unchanged layer reuse the exchange files of an
+# earlier export instead of exporting the layer again. Entries live
+# outside the run directories and are evicted least recently used
+# first once the cache outgrows its size budget.
+# ---------------------------------------------------------
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+from qgis.core import QgsFeatureRequest, QgsProviderRegistry, Qgis, QgsMessageLog
+
+from .qgisfmeformalgorithm_exchange import exchange_settings
+from .qgisfmeformalgorithm_lifecycle import ORPHAN_MAX_AGE, directory_size
+
+CACHE_DIR_NAME = 'qgis_fme_cache'
+MANIFEST_FILE = 'manifest.json'
+STAGING_PREFIX = '.staging_'
+
+# Number of features hashed for the change token of layers not stored in files.
+CACHE_SAMPLE_SIZE = 1000
+
+
+def export_cache_key(layer, source_definition, request, attributes, exchange_format, rollover_features=0,
+                     threads=1):
+    """Return the cache key for exporting a layer, or (None, reason) when it cannot be cached.
+
+    The key covers the layer source URI and subset string, the source
+    definition (selection, feature limit), the request filters, the exported
+    fields, the exchange format with its options, the way the export is split
+    into files (``rollover_features`` and the number of export ``threads``)
+    and a change token of the layer's data.
+
+    :return: Tuple (key, reason).
+    """
+    if layer is None:
+        return None, 'input is not a map layer'
+    if layer.isEditable() and layer.isModified():
+        return None, 'input layer has unsaved edits'
+    parts = {
+        'provider': layer.providerType(),
+        'source': layer.source(),
+        'subset': layer.subsetString(),
+        'name': layer.name(),
+        'filter_rect': request.filterRect().toString(12) if not request.filterRect().isNull() else '',
+        'filter_expression': request.filterExpression().expression() if request.filterExpression() else '',
+        'destination_crs': request.destinationCrs().authid() if request.destinationCrs().isValid() else '',
+        'attributes': attributes,
+        'format': {key: value for key, value in exchange_format.items() if key != 'label'},
+        'rollover_features': rollover_features,
+        'threads': threads,
+        'change_token': change_token(layer),
+    }
+    if source_definition is not None:
+        parts['feature_limit'] = source_definition.featureLimit
+        parts['definition_filter'] = getattr(source_definition, 'filterExpression', '')
+        if source_definition.selectedFeaturesOnly:
+            parts['selection'] = hashlib.sha1(
+                ','.join(str(fid) for fid in sorted(layer.selectedFeatureIds())).encode()).hexdigest()
+    key = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return key, 'layer unchanged since it was cached'
+
+
+def change_token(layer):
+    """Return a token that changes whenever the data of the layer changes.
+
+    File-based layers use the modification time and size of every file of the
+    dataset (e.g. .shp/.dbf/.shx, .gpkg/-wal); other layers a hash of the
+    feature count, extent and an evenly spaced sample of features.
+    """
+    path = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source()).get('path', '')
+    if path and os.path.isfile(path):
+        root = os.path.splitext(path)[0]
+        token = []
+        for dataset_file in sorted(set(glob.glob(glob.escape(root) + '.*') + glob.glob(glob.escape(path) + '-*'))):
+            stat = os.stat(dataset_file)
+            token.append(f'{os.path.basename(dataset_file)}:{stat.st_mtime_ns}:{stat.st_size}')
+        return ';'.join(token)
+    return _sampled_hash(layer)
+
+
+def _sampled_hash(layer, sample_size=CACHE_SAMPLE_SIZE):
+    """Hash the feature count, extent and an evenly spaced feature sample of a layer."""
+    digest = hashlib.sha1(f'{layer.featureCount()}:{layer.extent().toString(12)}'.encode())
+    fids = sorted(layer.allFeatureIds())
+    step = max(1, len(fids) // sample_size)
+    request = QgsFeatureRequest().setFilterFids(fids[::step])
+    for feature in layer.getFeatures(request):
+        digest.update(str(feature.id()).encode())
+        digest.update(repr(feature.attributes()).encode('utf-8', 'replace'))
+        if feature.hasGeometry():
+            digest.update(bytes(feature.geometry().asWkb()))
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """Exported input files kept across runs, keyed by export_cache_key."""
+
+    def __init__(self, settings=None):
+        if settings is None:
+            settings = exchange_settings()
+        self.root = os.path.join(settings['spill_dir'], CACHE_DIR_NAME)
+        self.budget = settings['cache_mb'] * 1024 * 1024
+        os.makedirs(self.root, exist_ok=True)
+
+    def lookup(self, key):
+        """Return the cached exchange files for a key, or None on a miss."""
+        manifest_path = os.path.join(self.root, key, MANIFEST_FILE)
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                files = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            return None
+        paths = [os.path.join(self.root, key, name) for name in files]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        os.utime(manifest_path)  # mark as recently used
+        return paths
+
+    def reserve(self):
+        """Return a new staging directory to export into."""
+        staging_dir = os.path.join(self.root, f'{STAGING_PREFIX}{uuid.uuid4().hex}')
+        os.makedirs(staging_dir)
+        return staging_dir
+
+    def discard(self, staging_dir):
+        """Remove a staging directory after a failed or canceled export."""
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def commit(self, key, staging_dir, paths):
+        """Move a finished export into the cache and return the cached file paths."""
+        with open(os.path.join(staging_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'files': [os.path.basename(path) for path in paths], 'created': time.time()}, f)
+        entry_dir = os.path.join(self.root, key)
+        for _ in range(2):
+            try:
+                os.rename(staging_dir, entry_dir)
+                break
+            except OSError:
+                if self.lookup(key):
+                    # A concurrent run cached the same export first
+                    self.discard(staging_dir)
+                    break
+                # A broken entry, e.g. of an interrupted run, is in the way
+                QgsMessageLog.logMessage(f"Replacing broken cached export {key}", "FME Connector", level=Qgis.Warning)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+        self.evict(keep=key)
+        # Without a usable entry the run goes on with the staged files, evict() removes them later
+        return self.lookup(key) or [os.path.join(staging_dir, os.path.basename(path)) for path in paths]
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits its budget."""
+        entries = []
+        # Not glob, it skips the dot-prefixed staging directories
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            manifest_path = os.path.join(entry_dir, MANIFEST_FILE)
+            if name.startswith(STAGING_PREFIX) or not os.path.exists(manifest_path):
+                # Staging directories of crashed sessions
+                if time.time() - os.path.getmtime(entry_dir) > ORPHAN_MAX_AGE:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            entries.append((os.path.getmtime(manifest_path), directory_size(entry_dir), entry_dir, name))
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, entry_dir, name in sorted(entries):
+            if total <= self.budget:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            QgsMessageLog.logMessage(f"Evicted cached export {name} ({size / 1048576:.1f} MB)",
+                                     "FME Connector", level=Qgis.Info)
+
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Delta mode for incrementally edited input layers.
+# The state of the last run of a workspace with the same parameters
+# (per-feature content hashes and FME's output) is kept between runs,
+# states not used for result_days are swept with the exchange files.
+# A run then only sends the inserted and modified features through
+# FME and takes the output of all other features from the state.
+# ---------------------------------------------------------
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+
+from qgis.core import (
+    QgsFeatureRequest, QgsFields, QgsVectorFileWriter, QgsVectorLayer, QgsProcessingException, Qgis, QgsMessageLog
+)
+
+from .qgisfmeformalgorithm_exchange import (
+    JOIN_KEY_FIELD, IMPORT_BATCH_SIZE, exchange_settings, import_layer, merged_schema
+)
+
+DELTA_DIR_NAME = 'qgis_fme_delta'
+STATE_FILE = 'state.sqlite'
+OUTPUT_FILE = 'output.gpkg'
+OUTPUT_TABLE = 'output'
+# Primary key of the stored output, kept out of the output fields.
+OUTPUT_FID = '_delta_fid'
+
+
+def delta_key(arguments, layer, request, attributes, exchange_format, tokens=()):
+    """Return the key of the delta state for a workspace run.
+
+    The key covers the workspace file and its modification time, the
+    command line arguments, the input layer source and subset, the request
+    filters, the exported fields and the exchange format. ``tokens`` are
+    extra strings, e.g. change tokens of additional inputs, that invalidate
+    the state when they change.
+    """
+    workspace = next((arg for arg in arguments if arg.lower().endswith('.fmw')), '')
+    parts = {
+        'workspace': workspace,
+        'workspace_mtime': os.path.getmtime(workspace) if os.path.isfile(workspace) else 0,
+        'arguments': [arg for arg in arguments if arg != workspace],
+        'source': layer.source() if layer is not None else '',
+        'subset': layer.subsetString() if layer is not None else '',
+        'filter_rect': request.filterRect().toString(12) if not request.filterRect().isNull() else '',
+        'filter_expression': request.filterExpression().expression() if request.filterExpression() else '',
+        'destination_crs': request.destinationCrs().authid() if request.destinationCrs().isValid() else '',
+        'attributes': attributes,
+        'format': {key: value for key, value in exchange_format.items() if key != 'label'},
+        'tokens': list(tokens),
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def feature_hashes(source, request, feedback):
+    """Return a content hash per feature id for the features matching the request."""
+    hashes = {}
+    for feature in source.getFeatures(request):
+        if feedback.isCanceled():
+            break
+        digest = hashlib.sha1(repr(feature.attributes()).encode('utf-8', 'replace'))
+        if feature.hasGeometry():
+            digest.update(bytes(feature.geometry().asWkb()))
+        hashes[feature.id()] = digest.digest()
+    return hashes
+
+
+def delta_plan(hashes, previous):
+    """Compare feature hashes with those of the previous run.
+
+    :return: Tuple (changed, deleted), the sorted ids of inserted or modified
+        features and the set of ids of deleted ones.
+    """
+    changed = sorted(fid for fid, digest in hashes.items() if previous.get(fid) != digest)
+    deleted = set(previous) - set(hashes)
+    return changed, deleted
+
+
+def stored_fields(fields):
+    """Return the fields of a stored output layer without its primary key."""
+    index = fields.lookupField(OUTPUT_FID)
+    if index >= 0:
+        fields = QgsFields(fields)
+        fields.remove(index)
+    return fields
+
+
+class DeltaState:
+    """Feature hashes and FME output of the last run, keyed by delta_key.
+
+    The hashes are kept in a SQLite database, the output in a GeoPackage
+    whose features carry the JOIN_KEY_FIELD of the input feature they were
+    made from.
+    """
+
+    def __init__(self, key, settings=None):
+        if settings is None:
+            settings = exchange_settings()
+        self.path = os.path.join(settings['spill_dir'], DELTA_DIR_NAME, key)
+        self.state_path = os.path.join(self.path, STATE_FILE)
+        self.output_path = os.path.join(self.path, OUTPUT_FILE)
+
+    def load(self):
+        """Return the feature hashes of the previous run, or None when there is no usable state."""
+        if not (os.path.isfile(self.state_path) and os.path.isfile(self.output_path)):
+            return None
+        # Mark the state as used, states unused for result_days are swept
+        os.utime(self.path)
+        try:
+            with closing(sqlite3.connect(self.state_path)) as connection:
+                return dict(connection.execute('SELECT fid, hash FROM hashes'))
+        except sqlite3.Error as e:
+            QgsMessageLog.logMessage(f"Delta state {self.state_path} could not be read: {e}",
+                                     "FME Connector", level=Qgis.Warning)
+            return None
+
+    def update(self, output_layers, replaced, hashes, transform_context, feedback):
+        """Merge the new FME output into the stored output and save the new state.
+
+        Stored features made from a ``replaced`` (modified or deleted) input
+        feature are dropped, the features of ``output_layers`` are added.
+
+        :return: The merged output as QgsVectorLayer.
+        """
+        previous = QgsVectorLayer(f'{self.output_path}|layername={OUTPUT_TABLE}', 'FME Output', 'ogr') \
+            if os.path.isfile(self.output_path) else None
+        layers = ([previous] if previous is not None and previous.isValid() else []) + list(output_layers)
+        if not layers:
+            raise QgsProcessingException("FME wrote no output and there is no output of a previous run.")
+        fields, wkb_type, crs = merged_schema(layers)
+        fields = stored_fields(fields)
+        if any(layer.fields().lookupField(JOIN_KEY_FIELD) == -1 for layer in output_layers):
+            self.clear()
+            raise QgsProcessingException(
+                f"The FME output has no {JOIN_KEY_FIELD} field, so it cannot be matched to the input features. "
+                f"Delta mode needs a workspace that keeps this attribute; run without delta mode.")
+
+        os.makedirs(self.path, exist_ok=True)
+        merged_path = os.path.join(self.path, f'new_{OUTPUT_FILE}')
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'GPKG'
+        options.layerName = OUTPUT_TABLE
+        options.fileEncoding = 'utf-8'
+        options.layerOptions = [f'FID={OUTPUT_FID}']
+        writer = QgsVectorFileWriter.create(merged_path, fields, wkb_type, crs, transform_context, options)
+        if writer.hasError() != QgsVectorFileWriter.NoError:
+            message = writer.errorMessage()
+            del writer
+            raise QgsProcessingException(f"Could not create the delta output {merged_path}: {message}")
+        kept = 0
+        if previous is not None and previous.isValid():
+            kept = self._copy_kept(previous, writer, fields, replaced)
+        added = sum(import_layer(layer, writer, IMPORT_BATCH_SIZE, fields=fields) for layer in output_layers)
+        del writer
+        previous = layers = None
+
+        os.replace(merged_path, self.output_path)
+        with closing(sqlite3.connect(self.state_path)) as connection, connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS hashes (fid INTEGER PRIMARY KEY, hash BLOB NOT NULL)')
+            connection.execute('DELETE FROM hashes')
+            connection.executemany('INSERT INTO hashes VALUES (?, ?)', hashes.items())
+        feedback.pushInfo(f"Delta output: {kept} features kept from the previous run, {added} from FME")
+        return QgsVectorLayer(f'{self.output_path}|layername={OUTPUT_TABLE}', 'FME Output', 'ogr')
+
+    def clear(self):
+        """Delete the state so the next run processes all features."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    @staticmethod
+    def _copy_kept(layer, writer, fields, replaced):
+        """Copy the stored features not made from a replaced input feature into the writer."""
+        key_index = layer.fields().lookupField(JOIN_KEY_FIELD)
+        positions = [fields.lookupField(name) for name in layer.fields().names()]
+        kept = 0
+        batch = []
+        for feature in layer.getFeatures(QgsFeatureRequest()):
+            attributes = feature.attributes()
+            try:
+                if int(attributes[key_index]) in replaced:
+                    continue
+            except (TypeError, ValueError):
+                pass
+            values = [None] * fields.count()
+            for value, position in zip(attributes, positions):
+                if position >= 0:
+                    values[position] = value
+            feature.setFields(fields, False)
+            feature.setAttributes(values)
+            batch.append(feature)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                kept += _write_kept(writer, batch)
+                batch = []
+        if batch:
+            kept += _write_kept(writer, batch)
+        return kept
+
+
+def _write_kept(writer, batch):
+    """Add a batch of stored features to the merged output, raising on failure."""
+    if not writer.addFeatures(batch):
+        raise QgsProcessingException(f"Error writing the delta output: {writer.errorMessage()}")
+    return len(batch)
@@ -0,0 +1,1571 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Exchange stage between QGIS and FME.
+# Features are streamed from the processing source to the exchange
+# file in bounded batches, so peak memory does not depend on the
+# size of the input layer.
+# ---------------------------------------------------------
+
+import configparser
+import errno
+import glob
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from osgeo import gdal, ogr
+from qgis.core import (
+    QgsFeatureRequest, QgsVectorFileWriter, QgsProcessingException, Qgis, QgsMessageLog,
+    QgsProviderRegistry, QgsDataProvider, QgsFeatureSink, QgsCoordinateReferenceSystem,
+    QgsJsonUtils, QgsWkbTypes, QgsFields, QgsField, QgsFeature, QgsVectorLayer, QgsVectorLayerFeatureSource
+)
+from PyQt6.QtCore import Qt, QVariant, QMetaType, QDate, QDateTime, QTime, QByteArray
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, point layers then use the generic writers
+    np = None
+
+# Number of features handed to the writer at once.
+EXPORT_BATCH_SIZE = 10000
+
+# Number of features handed to the output sink at once.
+IMPORT_BATCH_SIZE = 10000
+
+# Rows per Parquet row group, output is read back in batches of the same size.
+PARQUET_ROW_GROUP_SIZE = 65536
+
+# Exchange file formats selectable per run: label, GDAL driver, file extension,
+# GDAL layer creation options, GDAL config options applied while writing,
+# whether one file can hold several layers, the number of features read back
+# per batch, the FME reader/writer short name and the approximate file size per
+# byte of WKB geometry and attribute text, used to estimate exchange sizes.
+EXCHANGE_FORMATS = {
+    'GEOJSON': {
+        'label': 'GeoJSON',
+        'driver': 'GeoJSON',
+        'extension': 'geojson',
+        # No per-feature bbox members, FME computes extents itself
+        'layer_options': ['WRITE_BBOX=NO'],
+        'config_options': {},
+        'multi_layer': False,
+        'read_batch_size': IMPORT_BATCH_SIZE,
+        'fme_format': 'GEOJSON',
+        'size_factor': 2.5,
+    },
+    'FLATGEOBUF': {
+        'label': 'FlatGeobuf',
+        'driver': 'FlatGeobuf',
+        'extension': 'fgb',
+        'layer_options': ['SPATIAL_INDEX=YES'],
+        'config_options': {},
+        'multi_layer': False,
+        'read_batch_size': IMPORT_BATCH_SIZE,
+        'fme_format': 'FLATGEOBUF',
+        'size_factor': 1.1,
+    },
+    'GEOPACKAGE': {
+        'label': 'GeoPackage',
+        'driver': 'GPKG',
+        'extension': 'gpkg',
+        # FME reads the input tables sequentially, skip building an R-tree on them
+        'layer_options': ['SPATIAL_INDEX=NO'],
+        # WAL journal without fsync per commit, QgsVectorFileWriter wraps the
+        # whole layer in a single transaction
+        'config_options': {'OGR_SQLITE_JOURNAL': 'WAL', 'OGR_SQLITE_SYNCHRONOUS': 'OFF'},
+        'multi_layer': True,
+        'read_batch_size': IMPORT_BATCH_SIZE,
+        'fme_format': 'OGCGEOPACKAGE',
+        'size_factor': 1.3,
+    },
+    'GEOPARQUET': {
+        'label': 'GeoParquet',
+        'driver': 'Parquet',
+        'extension': 'parquet',
+        # Columnar, ZSTD compressed, dictionary encoded strings (Arrow writer default)
+        'layer_options': ['COMPRESSION=ZSTD', 'GEOMETRY_ENCODING=WKB',
+                          f'ROW_GROUP_SIZE={PARQUET_ROW_GROUP_SIZE}'],
+        'config_options': {},
+        'multi_layer': False,
+        'read_batch_size': PARQUET_ROW_GROUP_SIZE,
+        'fme_format': 'PARQUET',
+        'size_factor': 0.6,
+    },
+}
+
+# Minimum number of features per shard when the export is split across threads.
+SHARD_MIN_FEATURES = 100000
+
+# Attribute carrying the source feature id through FME when only part of the
+# input fields is exported, used to re-attach the others on import.
+JOIN_KEY_FIELD = '_qgis_fid'
+
+# Full double precision for coordinates written by the Python GeoJSON writer,
+# the point writer then uses the shortest round-trip representation.
+FULL_PRECISION = 17
+
+# Coordinate decimals written for RFC 7946 GeoJSON, the GDAL driver's default.
+RFC7946_PRECISION = 7
+
+# Text between and after the features of a FeatureCollection written by the Python GeoJSON writer.
+GEOJSON_SEPARATOR = ',\n'
+GEOJSON_FOOTER = '\n]}\n'
+
+# Exchange directory settings are read from the [Exchange] section of the
+# plugin's fme_settings.ini:
+#   ram_dir           RAM-backed filesystem
+#   memory_budget_mb  largest estimated exchange size kept in RAM
+#   spill_dir         fast local disk used otherwise, the system temp directory when empty
+#   quota_mb          disk quota for the exchange files of concurrent runs per directory, 0 disables it
+#   cache_mb          size budget of the export cache kept in the spill directory
+#   result_days       days referenced outputs are kept in the spill directory
+SETTINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fme_settings.ini')
+EXCHANGE_SECTION = 'Exchange'
+DEFAULT_RAM_DIR = '/dev/shm' if sys.platform.startswith('linux') else ''
+DEFAULT_MEMORY_BUDGET_MB = 1024
+DEFAULT_QUOTA_MB = 10240
+DEFAULT_CACHE_MB = 2048
+DEFAULT_RESULT_DAYS = 7
+
+# Number of features sampled to estimate the exchange size.
+ESTIMATE_SAMPLE_SIZE = 500
+
+# Size of the probe file written to measure the throughput of an exchange directory.
+THROUGHPUT_PROBE_SIZE = 8 * 1024 * 1024
+
+# gzip level by measured write throughput (MB/s): the slower the directory,
+# e.g. on NFS/SMB, the more CPU is spent on compression.
+COMPRESSION_LEVELS = ((25, 6), (150, 3))
+DEFAULT_COMPRESSION_LEVEL = 1
+
+# Measured throughput per directory, probed once per session.
+_throughput_cache = {}
+
+# FME reader short names for the file formats that can be handed to FME as-is.
+PASSTHROUGH_FORMATS = {
+    '.geojson': 'GEOJSON',
+    '.json': 'GEOJSON',
+    '.gpkg': 'OGCGEOPACKAGE',
+    '.shp': 'ESRISHAPE',
+}
+
+# FME writer short names for the output files FME can write into directly.
+DIRECT_WRITE_FORMATS = {
+    '.gpkg': 'OGCGEOPACKAGE',
+}
+
+
+def source_dataset_parameter(exchange_format):
+    """Return the reader parameter name FME publishes for an exchange format."""
+    return f"SourceDataset_{exchange_format['fme_format']}"
+
+
+def dest_dataset_parameter(exchange_format):
+    """Return the writer parameter name FME publishes for an exchange format."""
+    return f"DestDataset_{exchange_format['fme_format']}"
+
+
+def exchange_format_for_parameter(parameter):
+    """Return the exchange format matching a SourceDataset_*/DestDataset_* parameter, or None."""
+    fme_format = parameter.split('_', 1)[-1].upper() if parameter else ''
+    return next((f for f in EXCHANGE_FORMATS.values() if f['fme_format'] == fme_format), None)
+
+
+def exchange_settings():
+    """Return the exchange directory settings from fme_settings.ini, with defaults."""
+    config = configparser.ConfigParser()
+    config.read(SETTINGS_PATH)
+    section = config[EXCHANGE_SECTION] if config.has_section(EXCHANGE_SECTION) else {}
+    return {
+        'ram_dir': section.get('ram_dir', DEFAULT_RAM_DIR).strip(),
+        'memory_budget_mb': _setting_number(section, 'memory_budget_mb', DEFAULT_MEMORY_BUDGET_MB),
+        'spill_dir': section.get('spill_dir', '').strip() or tempfile.gettempdir(),
+        'quota_mb': _setting_number(section, 'quota_mb', DEFAULT_QUOTA_MB),
+        'cache_mb': _setting_number(section, 'cache_mb', DEFAULT_CACHE_MB),
+        'result_days': _setting_number(section, 'result_days', DEFAULT_RESULT_DAYS),
+    }
+
+
+def _setting_number(section, key, default):
+    """Return a numeric setting, falling back to the default when it is not a number."""
+    try:
+        return float(section.get(key, default))
+    except ValueError:
+        return default
+
+
+def estimate_exchange_size(source, exchange_format, sample_size=ESTIMATE_SAMPLE_SIZE):
+    """Estimate the size in bytes of one exchange file for the source from a feature sample."""
+    count = source.featureCount()
+    if count <= 0:
+        return 0
+    sampled = sample_bytes = 0
+    for feature in source.getFeatures(QgsFeatureRequest().setLimit(sample_size)):
+        if feature.hasGeometry():
+            sample_bytes += len(feature.geometry().asWkb())
+        sample_bytes += sum(len(str(value)) for value in feature.attributes())
+        sampled += 1
+    if not sampled:
+        return 0
+    return int(sample_bytes / sampled * count * exchange_format['size_factor'])
+
+
+def exchange_directory(estimated_bytes=0, settings=None):
+    """Pick the directory for a run's exchange files.
+
+    The RAM-backed directory is used when the estimated size fits both the
+    memory budget and the free space there, the spill directory otherwise.
+
+    :return: Tuple (directory, tier), tier is 'memory' or 'disk'.
+    """
+    if settings is None:
+        settings = exchange_settings()
+    ram_dir = settings['ram_dir']
+    if ram_dir and os.path.isdir(ram_dir) and os.access(ram_dir, os.W_OK):
+        if (estimated_bytes <= settings['memory_budget_mb'] * 1024 * 1024
+                and estimated_bytes < shutil.disk_usage(ram_dir).free):
+            return ram_dir, 'memory'
+    spill_dir = settings['spill_dir']
+    os.makedirs(spill_dir, exist_ok=True)
+    return spill_dir, 'disk'
+
+
+def directory_throughput(directory):
+    """Return the write throughput of a directory in MB/s, measured once per session."""
+    if directory not in _throughput_cache:
+        probe_path = os.path.join(directory, f'.fme_probe_{os.getpid()}')
+        data = os.urandom(THROUGHPUT_PROBE_SIZE)  # incompressible, filesystem compression can't skew it
+        start = time.perf_counter()
+        try:
+            with open(probe_path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            if os.path.exists(probe_path):
+                os.remove(probe_path)
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        _throughput_cache[directory] = THROUGHPUT_PROBE_SIZE / 1048576 / elapsed
+    return _throughput_cache[directory]
+
+
+def compression_level(throughput):
+    """Return the gzip level for a directory with the given write throughput in MB/s."""
+    for max_throughput, level in COMPRESSION_LEVELS:
+        if throughput <= max_throughput:
+            return level
+    return DEFAULT_COMPRESSION_LEVEL
+
+
+def with_compression(exchange_format, level):
+    """Return a copy of a GeoJSON exchange format written gzip compressed at the given level."""
+    exchange_format = dict(exchange_format)
+    exchange_format['compression_level'] = level
+    exchange_format['extension'] = f"{exchange_format['extension']}.gz"
+    return exchange_format
+
+
+def with_export_options(exchange_format, coordinate_precision=-1, rfc7946=False, drop_nulls=False):
+    """Return a copy of the exchange format carrying the per-run export options.
+
+    The options only affect GeoJSON: ``coordinate_precision`` limits the number
+    of decimals written (-1 keeps full precision), ``rfc7946`` writes RFC 7946
+    GeoJSON in WGS 84 and ``drop_nulls`` omits null properties.
+    """
+    exchange_format = dict(exchange_format)
+    if exchange_format['driver'] != 'GeoJSON':
+        return exchange_format
+    layer_options = list(exchange_format['layer_options'])
+    if coordinate_precision is not None and coordinate_precision >= 0:
+        layer_options.append(f'COORDINATE_PRECISION={coordinate_precision}')
+    if rfc7946:
+        layer_options.append('RFC7946=YES')
+    exchange_format['layer_options'] = layer_options
+    exchange_format['coordinate_precision'] = coordinate_precision
+    exchange_format['rfc7946'] = rfc7946
+    exchange_format['drop_nulls'] = drop_nulls
+    return exchange_format
+
+
+def check_exchange_format(exchange_format):
+    """Raise if the GDAL driver needed for an exchange format is not available."""
+    if gdal.GetDriverByName(exchange_format['driver']) is None:
+        raise QgsProcessingException(
+            f"The {exchange_format['label']} exchange format needs the GDAL {exchange_format['driver']} "
+            f"driver, which is not available in this QGIS installation.")
+
+
+def exchange_table_name(name):
+    """Return a table name usable in a multi-layer exchange file for a layer name."""
+    table = re.sub(r'\W+', '_', name or '').strip('_').lower()
+    return table or 'input'
+
+
+def sublayer_names(layer):
+    """Return the names of the layers contained in the dataset of an OGR layer."""
+    names = []
+    for sublayer in layer.dataProvider().subLayers():
+        parts = sublayer.split(QgsDataProvider.sublayerSeparator())
+        if len(parts) > 1:
+            names.append(parts[1])
+    return names
+
+
+@contextmanager
+def _gdal_config(config_options):
+    """Apply GDAL config options to the current thread while the block runs."""
+    previous = {key: gdal.GetThreadLocalConfigOption(key, None) for key in config_options}
+    for key, value in config_options.items():
+        gdal.SetThreadLocalConfigOption(key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            gdal.SetThreadLocalConfigOption(key, value)
+
+
+def _create_writer(path, fields, wkb_type, crs, transform_context, exchange_format, layer_name=None):
+    """Create a QgsVectorFileWriter for the exchange file or raise on failure.
+
+    With a layer_name the layer is added to an existing multi-layer file
+    instead of overwriting it.
+    """
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = exchange_format['driver']
+    options.fileEncoding = 'utf-8'
+    options.layerOptions = list(exchange_format['layer_options'])
+    if layer_name:
+        options.layerName = layer_name
+        if os.path.exists(path):
+            options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteLayer
+    writer = QgsVectorFileWriter.create(path, fields, wkb_type, crs, transform_context, options)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        message = writer.errorMessage()
+        del writer
+        raise QgsProcessingException(f"Could not create exchange file {path}: {message}")
+    return writer
+
+
+def projected_fields(fields, attributes):
+    """Return the indices of the named fields and the exported QgsFields with the join key."""
+    indices = [fields.lookupField(name) for name in attributes]
+    indices = [index for index in indices if index >= 0]
+    projected = QgsFields()
+    for index in indices:
+        projected.append(fields.at(index))
+    projected.append(QgsField(JOIN_KEY_FIELD, QMetaType.Type.LongLong))
+    return indices, projected
+
+
+def _project_feature(feature, fields, indices):
+    """Return a copy of the feature holding only the projected attributes and its id."""
+    attributes = feature.attributes()
+    projected = QgsFeature(fields, feature.id())
+    projected.setGeometry(feature.geometry())
+    projected.setAttributes([attributes[index] for index in indices] + [feature.id()])
+    return projected
+
+
+def export_source(source, path, exchange_format, transform_context, feedback, request=None,
+                  layer_name=None, batch_size=EXPORT_BATCH_SIZE, attributes=None, dataset=None):
+    """Stream the features of a processing source into an exchange file.
+
+    Features are pulled from ``source`` and written in batches of ``batch_size``,
+    so only one batch is held in memory at any time. For multi-layer formats
+    ``layer_name`` names the table the features are written to. With a list of
+    ``attributes`` only those fields are written, plus the JOIN_KEY_FIELD.
+    ``dataset`` is the (path, layer name) of an unfiltered OGR source, which
+    lets the vectorized point writer read it in bulk.
+
+    :return: Number of features written.
+    """
+    if exchange_format.get('compression_level'):
+        return _export_compressed(source, path, exchange_format, transform_context, feedback,
+                                  request, attributes, dataset)
+    if exchange_format['driver'] == 'GeoJSON' and point_fast_path(source):
+        # Point layers skip the GDAL writer for the vectorized one
+        with open(path, 'w', encoding='utf-8', buffering=1 << 20) as stream:
+            return write_geojson(stream, source, transform_context, feedback, request,
+                                 exchange_format.get('coordinate_precision'),
+                                 exchange_format.get('drop_nulls', False), attributes, dataset,
+                                 exchange_format.get('rfc7946', False))
+    if exchange_format.get('drop_nulls'):
+        # The GDAL GeoJSON driver always writes null properties, use the Python writer
+        with open(path, 'w', encoding='utf-8', buffering=1 << 20) as stream:
+            return write_geojson(stream, source, transform_context, feedback, request,
+                                 exchange_format.get('coordinate_precision'), drop_nulls=True,
+                                 attributes=attributes, rfc7946=exchange_format.get('rfc7946', False))
+    with _gdal_config(exchange_format['config_options']):
+        return _export_features(source, path, exchange_format, transform_context, feedback,
+                                request, layer_name, batch_size, attributes)
+
+
+def _export_compressed(source, path, exchange_format, transform_context, feedback, request, attributes,
+                       dataset=None):
+    """Write the source as gzip compressed GeoJSON and report the savings.
+
+    The coordinates are the ones the uncompressed export writes: the source
+    CRS, or the request's destination CRS, unless RFC 7946 output is asked for.
+    """
+    with gzip.open(path, 'wb', compresslevel=exchange_format['compression_level']) as raw:
+        stream = _CountingWriter(raw)
+        written = write_geojson(stream, source, transform_context, feedback, request,
+                                exchange_format.get('coordinate_precision'),
+                                exchange_format.get('drop_nulls', False), attributes, dataset,
+                                exchange_format.get('rfc7946', False))
+    compressed = os.path.getsize(path)
+    saved = 100.0 * (1 - compressed / stream.size) if stream.size else 0
+    feedback.pushInfo(f"Compressed exchange: {compressed / 1048576:.1f} MB written instead of "
+                      f"{stream.size / 1048576:.1f} MB ({saved:.0f}% saved, gzip level "
+                      f"{exchange_format['compression_level']})")
+    return written
+
+
+class _CountingWriter:
+    """Text stream over a binary file that counts the UTF-8 bytes written."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.raw.write(data)
+        self.size += len(data)
+        return len(text)
+
+
+def _export_features(source, path, exchange_format, transform_context, feedback, request,
+                     layer_name, batch_size, attributes):
+    """Write the source features to the exchange file batch by batch."""
+    # Work on a copy, the attribute subset must not leak into the caller's request
+    request = QgsFeatureRequest(request) if request is not None else QgsFeatureRequest()
+    fields = source.fields()
+    indices = None
+    if attributes is not None:
+        indices, fields = projected_fields(fields, attributes)
+        request.setSubsetOfAttributes(indices)
+    # Features are reprojected by the iterator when the request has a destination CRS
+    crs = request.destinationCrs() if request.destinationCrs().isValid() else source.sourceCrs()
+    writer = _create_writer(path, fields, source.wkbType(), crs,
+                            transform_context, exchange_format, layer_name)
+    total = source.featureCount()
+    step = 100.0 / total if total and total > 0 else 0
+    written = 0
+    batch = []
+    try:
+        for feature in source.getFeatures(request):
+            if feedback.isCanceled():
+                break
+            batch.append(feature if indices is None else _project_feature(feature, fields, indices))
+            if len(batch) >= batch_size:
+                written += _write_batch(writer, batch, path)
+                batch = []
+                feedback.setProgress(int(written * step))
+        if batch and not feedback.isCanceled():
+            written += _write_batch(writer, batch, path)
+    finally:
+        # Deleting the writer flushes and closes the exchange file
+        del writer
+    QgsMessageLog.logMessage(f"Exported {written} features to {path}", "FME Connector", level=Qgis.Info)
+    return written
+
+
+def export_source_sharded(source, path, exchange_format, transform_context, feedback, request=None,
+                          layer_name=None, attributes=None, threads=1, dataset=None, max_features=0):
+    """Export the source into several shard files written in parallel.
+
+    The matching feature ids are split into contiguous ranges, one per shard;
+    every worker thread runs export_source with its own feature iterator on
+    its own shard file. A ``max_features`` above 0 also rolls over to a new
+    shard after that many features, whatever the number of threads. Sources
+    with fewer than SHARD_MIN_FEATURES features per shard and within
+    ``max_features`` are written to ``path`` as a single file, ``dataset`` is
+    only used for those.
+
+    :return: List of the exchange files written.
+    """
+    if request is None:
+        request = QgsFeatureRequest()
+    count = source.featureCount()
+    shards = min(threads, count // SHARD_MIN_FEATURES) if threads > 1 else 1
+    fids = []
+    if shards > 1 or 0 < max_features < count:
+        fids = _matching_feature_ids(source, request)
+    shard_size = -(-len(fids) // max(shards, 1))
+    if max_features > 0:
+        shard_size = min(shard_size, max_features)
+    if shard_size >= len(fids):
+        export_source(source, path, exchange_format, transform_context, feedback, request,
+                      layer_name, attributes=attributes, dataset=dataset)
+        return [path]
+    extension = f".{exchange_format['extension']}"
+    root = path[:-len(extension)] if path.endswith(extension) else path
+    jobs = []
+    for shard, start in enumerate(range(0, len(fids), shard_size)):
+        shard_request = QgsFeatureRequest(request)
+        shard_request.setFilterFids(fids[start:start + shard_size])
+        jobs.append((f'{root}_{shard}{extension}', shard_request))
+    feedback.pushInfo(f"Exporting {len(fids)} features in {len(jobs)} shards on {threads} threads")
+    progress = [0.0] * len(jobs)
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = [executor.submit(export_source, source, shard_path, exchange_format, transform_context,
+                                   _ShardFeedback(feedback, progress, index, lock), shard_request,
+                                   layer_name, attributes=attributes)
+                   for index, (shard_path, shard_request) in enumerate(jobs)]
+        for future in futures:
+            future.result()
+    return [shard_path for shard_path, _ in jobs]
+
+
+def _matching_feature_ids(source, request):
+    """Return the sorted ids of the source features matching the request filters."""
+    if request.filterType() == QgsFeatureRequest.FilterNone and request.filterRect().isNull():
+        return sorted(source.allFeatureIds())
+    id_request = QgsFeatureRequest(request)
+    if id_request.filterType() != QgsFeatureRequest.FilterExpression:
+        id_request.setNoAttributes()
+        id_request.setFlags(id_request.flags() | QgsFeatureRequest.NoGeometry)
+    return sorted(feature.id() for feature in source.getFeatures(id_request))
+
+
+class _ShardFeedback:
+    """Feedback proxy for one shard export, the shards' progress is summed up."""
+
+    def __init__(self, feedback, progress, index, lock):
+        self.feedback = feedback
+        self.progress = progress
+        self.index = index
+        self.lock = lock
+
+    def isCanceled(self):
+        return self.feedback.isCanceled()
+
+    def setProgress(self, progress):
+        with self.lock:
+            self.progress[self.index] = progress
+            self.feedback.setProgress(sum(self.progress))
+
+    def pushInfo(self, info):
+        self.feedback.pushInfo(info)
+
+
+class BackgroundFeedback:
+    """Feedback proxy for exports running next to the main export.
+
+    Cancellation and messages are forwarded; progress is left to the main
+    export so the progress bar does not jump between exports.
+    """
+
+    def __init__(self, feedback):
+        self.feedback = feedback
+
+    def isCanceled(self):
+        return self.feedback.isCanceled()
+
+    def setProgress(self, progress):
+        pass
+
+    def pushInfo(self, info):
+        self.feedback.pushInfo(info)
+
+
+class LayerSnapshot:
+    """Output layer prepared on the calling thread for import_layer on a worker thread.
+
+    Worker threads must not touch the QgsVectorLayer itself; they read a
+    QgsVectorLayerFeatureSource made from it and the fields and feature
+    count taken up front.
+    """
+
+    def __init__(self, layer):
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self._fields = layer.fields()
+        self._count = layer.featureCount()
+
+    def fields(self):
+        return self._fields
+
+    def featureCount(self):
+        return self._count
+
+    def getFeatures(self, request=None):
+        return self.source.getFeatures(request if request is not None else QgsFeatureRequest())
+
+
+def fme_dataset_list(paths):
+    """Return the FME dataset value for several files, each path quoted and space separated."""
+    if len(paths) == 1:
+        return paths[0]
+    return ' '.join(f'"{path}"' for path in paths)
+
+
+def _write_batch(writer, batch, path):
+    """Write one batch of features, raising if the writer rejects it."""
+    if not writer.addFeatures(batch):
+        raise QgsProcessingException(f"Error writing features to {path}: {writer.errorMessage()}")
+    return len(batch)
+
+
+def ogr_file_dataset(layer, source_definition=None):
+    """Return the dataset of an OGR layer whose features can be read straight from its file.
+
+    That is the case for an unfiltered, unedited layer of the OGR provider.
+
+    :return: Tuple (path, layer_name, reason), path is None when the layer
+        does not qualify and reason says why.
+    """
+    if layer is None or layer.providerType() != 'ogr':
+        return None, None, 'input is not a file-based layer'
+    if source_definition is not None and (
+            source_definition.selectedFeaturesOnly
+            or source_definition.featureLimit >= 0
+            or getattr(source_definition, 'filterExpression', '')):
+        return None, None, 'input is limited to selected or filtered features'
+    if layer.isEditable() and layer.isModified():
+        return None, None, 'input layer has unsaved edits'
+    uri_parts = QgsProviderRegistry.instance().decodeUri('ogr', layer.source())
+    if layer.subsetString() or uri_parts.get('subset'):
+        return None, None, 'input layer has a subset filter'
+    return uri_parts.get('path', ''), uri_parts.get('layerName'), 'unfiltered file-based layer'
+
+
+def passthrough_dataset(layer, source_definition, workspace_datasets):
+    """Work out whether an input layer can be handed to FME without exporting it.
+
+    The layer qualifies when it is an unfiltered, unedited OGR file in one of
+    PASSTHROUGH_FORMATS and the workspace has a reader of the same format.
+
+    :return: Tuple (arguments, reason). arguments is the list of command line
+        arguments pointing the workspace reader at the original dataset, or None
+        when the layer has to be exported; reason describes the decision.
+    """
+    path, layer_name, reason = ogr_file_dataset(layer, source_definition)
+    if path is None:
+        return None, reason
+    extension = os.path.splitext(path)[1].lower()
+    fme_format = PASSTHROUGH_FORMATS.get(extension)
+    if fme_format is None or not os.path.isfile(path):
+        return None, f'{extension or "this"} datasets are not passed through'
+    reader = next((d for d in workspace_datasets
+                   if d.get('ROLE') == 'READER' and d.get('PARAMETER')
+                   and d.get('FORMAT', '').upper() == fme_format), None)
+    if reader is None:
+        return None, f'the workspace has no published {fme_format} reader'
+
+    arguments = [f"--{reader['PARAMETER']}", path]
+    if fme_format == 'OGCGEOPACKAGE' and layer_name:
+        # Select the table through the reader's feature types parameter if it is published
+        feature_types = re.match(r'\$\((\w+)\)', reader.get('FEATURE_TYPES', ''))
+        if feature_types:
+            arguments.extend([f"--{feature_types.group(1)}", layer_name])
+        elif len(layer.dataProvider().subLayers()) > 1:
+            return None, f'the workspace cannot select table "{layer_name}" inside the GeoPackage'
+    return arguments, f"passing {path} to {reader['PARAMETER']}"
+
+
+def direct_write_dataset(destination, workspace_datasets, staging_path):
+    """Work out whether FME can write the output file itself instead of QGIS copying it.
+
+    That is the case for a GeoPackage destination when the workspace has a
+    published writer of the same format. FME writes to ``staging_path``,
+    which direct_write_output moves onto the destination once FME succeeded,
+    so a failed run leaves an existing destination untouched.
+
+    :return: Tuple (arguments, reason). arguments is the list of command line
+        arguments pointing the workspace writer at the staging path, or None
+        when the output has to be copied into the sink; reason describes the
+        decision.
+    """
+    if not destination or destination.startswith(('memory:', 'ogr:', 'postgres:', 'spatialite:')):
+        return None, 'the output is not a plain file'
+    extension = os.path.splitext(destination)[1].lower()
+    fme_format = DIRECT_WRITE_FORMATS.get(extension)
+    if fme_format is None:
+        return None, f'{extension or "this"} outputs are not written directly'
+    writer = next((d for d in workspace_datasets
+                   if d.get('ROLE') == 'WRITER' and d.get('PARAMETER')
+                   and d.get('FORMAT', '').upper() == fme_format), None)
+    if writer is None:
+        return None, f'the workspace has no published {fme_format} writer'
+    return [f"--{writer['PARAMETER']}", staging_path], f"{writer['PARAMETER']} writes {destination}"
+
+
+def direct_write_output(destination, staging_path):
+    """Move the file FME wrote for a direct-write destination onto it.
+
+    The destination is replaced like a sink would overwrite it, together
+    with the journal files of the previous GeoPackage.
+
+    :return: The destination path, or None when FME wrote no file.
+    """
+    if not os.path.isfile(staging_path):
+        return None
+    for path in (destination, f'{destination}-wal', f'{destination}-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+    shutil.move(staging_path, destination)
+    return destination
+
+
+def output_datasets(path, exchange_format):
+    """Return the files FME wrote for the destination dataset ``path``.
+
+    That is the file itself and the numbered or fanned out files next to it
+    (``<name>_*.<extension>``), or every exchange file below ``path`` when
+    FME wrote the dataset as a folder.
+    """
+    extension = f".{exchange_format['extension']}"
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(glob.escape(path), '**', f'*{extension}'), recursive=True))
+    root = path[:-len(extension)] if path.endswith(extension) else path
+    siblings = sorted(glob.glob(f'{glob.escape(root)}_*{extension}'))
+    return ([path] if os.path.isfile(path) else []) + siblings
+
+
+def output_feature_types(paths, exchange_format):
+    """Group the output files FME wrote by feature type.
+
+    Multi-layer formats hold one table per feature type, the other formats
+    one file per feature type named after it.
+
+    :return: Dict of feature type name to the list of QgsVectorLayer holding
+        its features, in the order they were found.
+    """
+    extension = f".{exchange_format['extension']}"
+    groups = {}
+    for path in paths:
+        if exchange_format['multi_layer']:
+            names = sublayer_names(QgsVectorLayer(path, 'FME Output', 'ogr'))
+            for name in names:
+                groups.setdefault(name, []).append(QgsVectorLayer(f'{path}|layername={name}', name, 'ogr'))
+            if names:
+                continue
+        name = os.path.basename(path)
+        name = name[:-len(extension)] if name.endswith(extension) else os.path.splitext(name)[0]
+        groups.setdefault(name, []).append(QgsVectorLayer(path, name, 'ogr'))
+    return groups
+
+
+def merged_schema(layers):
+    """Return the (fields, wkb_type, crs) of a layer holding the features of all given layers.
+
+    Fields are merged by name in order of appearance. Single and multi part
+    geometries of one geometry type merge into the multi part type, different
+    geometry types into Unknown.
+    """
+    fields = QgsFields()
+    for layer in layers:
+        for field in layer.fields():
+            if fields.lookupField(field.name()) == -1:
+                fields.append(field)
+    wkb_types = {layer.wkbType() for layer in layers}
+    wkb_type = layers[0].wkbType()
+    if len(wkb_types) > 1:
+        if len({QgsWkbTypes.geometryType(t) for t in wkb_types}) > 1:
+            return fields, QgsWkbTypes.Unknown, layers[0].sourceCrs()
+        wkb_type = QgsWkbTypes.multiType(wkb_type)
+        if any(QgsWkbTypes.hasZ(t) for t in wkb_types):
+            wkb_type = QgsWkbTypes.addZ(wkb_type)
+        if any(QgsWkbTypes.hasM(t) for t in wkb_types):
+            wkb_type = QgsWkbTypes.addM(wkb_type)
+    return fields, wkb_type, layers[0].sourceCrs()
+
+
+def import_layer(layer, sink, batch_size=IMPORT_BATCH_SIZE, restorer=None, fields=None, feedback=None):
+    """Copy the features of an output layer into a sink in batches.
+
+    Only one batch is held in memory at a time and every batch is added with
+    a single addFeatures call. With a ``feedback`` progress is reported after
+    each batch and the import stops early once it is canceled.
+
+    With ``fields`` (see merged_schema) the attributes are matched to those
+    fields by name, so several output layers can be merged into one sink;
+    attributes without a matching field are left out.
+    With an AttributeRestorer the attributes left out of the export are
+    re-attached to each batch before it is added.
+
+    :return: Number of features added to the sink.
+    """
+    positions = None
+    if fields is not None and layer.fields().names() != fields.names():
+        positions = [fields.lookupField(name) for name in layer.fields().names()]
+    total = layer.featureCount() if feedback is not None else 0
+    step = 100.0 / total if total > 0 else 0
+    added = 0
+    batch = []
+    for feature in layer.getFeatures():
+        if positions is not None:
+            feature = _remap_feature(feature, fields, positions)
+        batch.append(feature)
+        if len(batch) >= batch_size:
+            added += _add_batch(sink, batch if restorer is None else restorer.restore(batch))
+            batch = []
+            if feedback is not None:
+                if feedback.isCanceled():
+                    return added
+                feedback.setProgress(int(added * step))
+    if batch:
+        added += _add_batch(sink, batch if restorer is None else restorer.restore(batch))
+    return added
+
+
+class AttributeRestorer:
+    """Re-attach the attributes left out of the export from the original source.
+
+    FME output features are matched to the source features through the
+    JOIN_KEY_FIELD; the join key itself is not part of the restored features.
+    """
+
+    def __init__(self, source, dropped, feedback=None):
+        self.source = source
+        self.feedback = feedback
+        source_fields = source.fields()
+        self.dropped_indices = [source_fields.lookupField(name) for name in dropped]
+        self.key_index = -1
+        self.mapping = []
+        self.output_fields = None
+
+    def fields(self, output_fields):
+        """Return the restored fields for the fields FME wrote and remember the mapping."""
+        self.key_index = output_fields.lookupField(JOIN_KEY_FIELD)
+        self.output_fields = QgsFields()
+        self.mapping = []
+        for index, field in enumerate(output_fields):
+            if index != self.key_index:
+                self.output_fields.append(field)
+                self.mapping.append((False, index))
+        for index in self.dropped_indices:
+            field = self.source.fields().at(index)
+            if self.output_fields.lookupField(field.name()) == -1:
+                self.output_fields.append(field)
+                self.mapping.append((True, index))
+        if self.key_index == -1 and self.dropped_indices:
+            message = (f"FME output has no {JOIN_KEY_FIELD} field, the fields left out of the export "
+                       f"({', '.join(self.source.fields().at(index).name() for index in self.dropped_indices)}) "
+                       f"cannot be re-attached and are empty")
+            if self.feedback is not None:
+                self.feedback.pushWarning(message)
+            else:
+                QgsMessageLog.logMessage(message, "FME Connector", level=Qgis.Warning)
+        return self.output_fields
+
+    def restore(self, features):
+        """Return the batch with the dropped attributes taken from the source features."""
+        source_attributes = {}
+        if self.key_index >= 0 and self.dropped_indices:
+            fids = {self._fid(feature.attributes()[self.key_index]) for feature in features}
+            fids.discard(None)
+            request = QgsFeatureRequest().setFilterFids(list(fids)).setFlags(QgsFeatureRequest.NoGeometry)
+            request.setSubsetOfAttributes(self.dropped_indices)
+            source_attributes = {f.id(): f.attributes() for f in self.source.getFeatures(request)}
+        restored = []
+        for feature in features:
+            attributes = feature.attributes()
+            original = source_attributes.get(self._fid(attributes[self.key_index])) if self.key_index >= 0 else None
+            values = [(original[index] if original else None) if from_source else attributes[index]
+                      for from_source, index in self.mapping]
+            restored_feature = QgsFeature(self.output_fields, feature.id())
+            restored_feature.setGeometry(feature.geometry())
+            restored_feature.setAttributes(values)
+            restored.append(restored_feature)
+        return restored
+
+    @staticmethod
+    def _fid(value):
+        """Convert a join key value read back from FME to a feature id."""
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+
+class GeometryTypeSinks:
+    """Sink proxy routing every feature to the sink of its geometry type.
+
+    ``sinks`` maps QgsWkbTypes geometry types (PointGeometry, LineGeometry,
+    PolygonGeometry) to sinks. Features without a sink for their type, and
+    features without geometry, go to ``fallback``. Each batch is split once
+    and handed to every sink with a single addFeatures call, so mixed output
+    is routed in the same pass that reads it.
+    """
+
+    def __init__(self, sinks, fallback):
+        self.sinks = sinks
+        self.fallback = fallback
+        self.counts = {geometry_type: 0 for geometry_type in sinks}
+        self.error = ''
+
+    def addFeatures(self, features, flags=QgsFeatureSink.FastInsert):
+        routed = {}
+        for feature in features:
+            geometry_type = (QgsWkbTypes.geometryType(feature.geometry().wkbType())
+                             if feature.hasGeometry() else QgsWkbTypes.NullGeometry)
+            if geometry_type not in self.sinks:
+                geometry_type = None
+            routed.setdefault(geometry_type, []).append(feature)
+        for geometry_type, batch in routed.items():
+            sink = self.sinks[geometry_type] if geometry_type is not None else self.fallback
+            if not sink.addFeatures(batch, flags):
+                self.error = sink.lastError()
+                return False
+            if geometry_type is not None:
+                self.counts[geometry_type] += len(batch)
+        return True
+
+    def lastError(self):
+        return self.error
+
+
+def _remap_feature(feature, fields, positions):
+    """Return the feature with its attributes moved to the given positions in ``fields``."""
+    attributes = [None] * fields.count()
+    for value, position in zip(feature.attributes(), positions):
+        if position >= 0:
+            attributes[position] = value
+    remapped = QgsFeature(fields, feature.id())
+    remapped.setGeometry(feature.geometry())
+    remapped.setAttributes(attributes)
+    return remapped
+
+
+def _add_batch(sink, batch):
+    """Add one batch of features to a sink, raising if the sink rejects it."""
+    if not sink.addFeatures(batch, QgsFeatureSink.FastInsert):
+        raise QgsProcessingException(f"Error adding features to the output layer: {sink.lastError()}")
+    return len(batch)
+
+
+def pipes_supported():
+    """Return True if named pipes can be used as exchange transport on this platform."""
+    return sys.platform.startswith('linux') and hasattr(os, 'mkfifo')
+
+
+def run_fme(cmd_list, feedback, producer=None, consumer=None):
+    """Run the FME command and collect its output.
+
+    ``producer`` is called with the running process in a worker thread so
+    exchange data can be fed to FME while it is already reading; ``consumer``
+    is called with the process in the calling thread to read FME's output
+    while it is still being written. The process is killed when the run is
+    canceled or either callable fails.
+
+    :return: subprocess.CompletedProcess with the decoded stdout and stderr.
+    """
+    popen_kwargs = {'stdout': subprocess.PIPE, 'stderr': subprocess.PIPE, 'text': True}
+    if sys.platform == 'win32':
+        popen_kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+    process = subprocess.Popen(cmd_list, **popen_kwargs)
+
+    # Drain both streams in the background so FME never blocks on a full pipe
+    output = {}
+    workers = [threading.Thread(target=_drain, args=(process.stdout, output, 'stdout'), daemon=True),
+               threading.Thread(target=_drain, args=(process.stderr, output, 'stderr'), daemon=True)]
+    errors = []
+    if producer is not None:
+        workers.append(threading.Thread(target=_produce, args=(producer, process, errors), daemon=True))
+    for worker in workers:
+        worker.start()
+    try:
+        if consumer is not None:
+            consumer(process)
+        while True:
+            try:
+                process.wait(timeout=0.2)
+                break
+            except subprocess.TimeoutExpired:
+                if feedback.isCanceled() or errors:
+                    process.kill()
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.wait()
+        for worker in workers:
+            worker.join()
+    if errors:
+        raise errors[0]
+    return subprocess.CompletedProcess(cmd_list, process.returncode,
+                                       output.get('stdout', ''), output.get('stderr', ''))
+
+
+def _produce(producer, process, errors):
+    """Run a producer in a worker thread, keeping its exception for the caller."""
+    try:
+        producer(process)
+    except Exception as e:
+        errors.append(e)
+        process.kill()
+
+
+def _drain(stream, output, key):
+    """Read a process stream to the end and store its content."""
+    output[key] = stream.read()
+    stream.close()
+
+
+def open_pipe_writer(path, process, feedback):
+    """Open the write end of a named pipe once FME has opened it for reading.
+
+    Opening is retried without blocking, so a process that exits before reading
+    or a canceled run does not hang the algorithm.
+    """
+    while True:
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            if process.poll() is not None:
+                raise QgsProcessingException(f"FME exited before opening the input pipe {path}.")
+            if feedback.isCanceled():
+                raise QgsProcessingException("Export of the input layer was canceled.")
+            time.sleep(0.05)
+    os.set_blocking(fd, True)
+    return os.fdopen(fd, 'w', encoding='utf-8', buffering=1 << 20)
+
+
+def open_pipe_reader(path, process, feedback):
+    """Open the read end of a named pipe once FME has opened it for writing.
+
+    The blocking open runs in a helper thread; if FME exits without opening
+    the pipe or the run is canceled, a writer is connected and closed so the
+    open returns and the caller simply reads an empty stream.
+    """
+    opened = {}
+    opener = threading.Thread(target=lambda: opened.update(fd=os.open(path, os.O_RDONLY)), daemon=True)
+    opener.start()
+    while opener.is_alive():
+        opener.join(0.05)
+        if opener.is_alive() and (process.poll() is not None or feedback.isCanceled()):
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_NONBLOCK))
+            except OSError:
+                pass
+    return os.fdopen(opened['fd'], 'r', encoding='utf-8')
+
+
+def write_geojson(stream, source, transform_context, feedback, request=None,
+                  coordinate_precision=-1, drop_nulls=False, attributes=None, dataset=None, rfc7946=False):
+    """Write the source features to a stream as a GeoJSON FeatureCollection.
+
+    Features are written one at a time, so the stream can be a named pipe FME
+    reads from while the export is still running. As with the GDAL GeoJSON
+    driver, coordinates stay in the source CRS, or the request's destination
+    CRS, which the collection names in its crs member; with ``rfc7946`` they
+    are written in WGS 84 without a crs member. Coordinates are rounded to
+    ``coordinate_precision`` decimals when it is not negative, to 7 decimals
+    for RFC 7946 otherwise, and null properties are left out when
+    ``drop_nulls`` is set. With a list of ``attributes`` only those fields are
+    written, plus the JOIN_KEY_FIELD. Point layers are written by
+    write_points_geojson when NumPy is available.
+
+    :return: Number of features written.
+    """
+    if point_fast_path(source):
+        return write_points_geojson(stream, source, transform_context, feedback, request,
+                                    coordinate_precision, drop_nulls, attributes, dataset, rfc7946)
+    request = QgsFeatureRequest(request) if request is not None else QgsFeatureRequest()
+    header = _geojson_header(source, request, transform_context, rfc7946)
+    fields = source.fields()
+    indices = None
+    if attributes is not None:
+        indices, fields = projected_fields(fields, attributes)
+        request.setSubsetOfAttributes(indices)
+    field_names = fields.names()
+    precision = _geojson_precision(coordinate_precision, rfc7946)
+    total = source.featureCount()
+    step = 100.0 / total if total and total > 0 else 0
+    written = 0
+    stream.write(header)
+    for feature in source.getFeatures(request):
+        if feedback.isCanceled():
+            break
+        if indices is not None:
+            feature = _project_feature(feature, fields, indices)
+        if written:
+            stream.write(GEOJSON_SEPARATOR)
+        stream.write(_geojson_feature(feature, field_names, precision, drop_nulls))
+        written += 1
+        if written % EXPORT_BATCH_SIZE == 0:
+            feedback.setProgress(int(written * step))
+    stream.write(GEOJSON_FOOTER)
+    return written
+
+
+def _geojson_header(source, request, transform_context, rfc7946):
+    """Set the request up for the exchange CRS and return the FeatureCollection text before the features."""
+    if rfc7946:
+        request.setDestinationCrs(QgsCoordinateReferenceSystem('EPSG:4326'), transform_context)
+    crs = request.destinationCrs() if request.destinationCrs().isValid() else source.sourceCrs()
+    header = {'type': 'FeatureCollection'}
+    urn = None if rfc7946 else _crs_urn(crs)
+    if urn:
+        header['crs'] = {'type': 'name', 'properties': {'name': urn}}
+    return json.dumps(header, separators=(',', ':'))[:-1] + ',"features":[\n'
+
+
+def _crs_urn(crs):
+    """Return the OGC URN the GDAL GeoJSON driver names a CRS with, None when it has no authority code."""
+    if not crs.isValid():
+        return None
+    if crs.authid() == 'EPSG:4326':
+        return 'urn:ogc:def:crs:OGC:1.3:CRS84'
+    authority, _, code = crs.authid().partition(':')
+    if not code or authority.upper() == 'USER':
+        return None
+    return f'urn:ogc:def:crs:{authority}::{code}'
+
+
+def _geojson_precision(coordinate_precision, rfc7946):
+    """Return the number of coordinate decimals to write."""
+    if coordinate_precision is not None and coordinate_precision >= 0:
+        return coordinate_precision
+    return RFC7946_PRECISION if rfc7946 else FULL_PRECISION
+
+
+def point_fast_path(source):
+    """Return True when the source can go through the vectorized point writer."""
+    return np is not None and source.wkbType() == QgsWkbTypes.Point
+
+
+def write_points_geojson(stream, source, transform_context, feedback, request=None,
+                         coordinate_precision=-1, drop_nulls=False, attributes=None, dataset=None, rfc7946=False):
+    """Write a 2D point source as a GeoJSON FeatureCollection from NumPy arrays, batch by batch.
+
+    Coordinates and attribute columns are pulled in bulk: straight from the
+    file through GDAL's Arrow interface when ``dataset`` is given and nothing
+    needs filtering or reprojecting, from the QGIS feature iterator otherwise.
+    Each batch is then formatted column by column instead of per QgsFeature.
+    Takes the same arguments as write_geojson.
+
+    :return: Number of features written.
+    """
+    request = QgsFeatureRequest(request) if request is not None else QgsFeatureRequest()
+    header = _geojson_header(source, request, transform_context, rfc7946)
+    fields = source.fields()
+    if attributes is None:
+        indices = list(range(fields.count()))
+    else:
+        indices = projected_fields(fields, attributes)[0]
+        request.setSubsetOfAttributes(indices)
+    names = [fields.at(index).name() for index in indices]
+    keys = [json.dumps(name, ensure_ascii=False) + ':' for name in names]
+    if attributes is not None:
+        keys.append(json.dumps(JOIN_KEY_FIELD) + ':')
+    precision = _geojson_precision(coordinate_precision, rfc7946)
+
+    batches = None
+    if (dataset and request.filterType() == QgsFeatureRequest.FilterNone and request.filterRect().isNull()
+            and (not request.destinationCrs().isValid() or request.destinationCrs() == source.sourceCrs())):
+        batches = _arrow_point_batches(dataset[0], dataset[1], names)
+    if batches is None:
+        batches = _feature_point_batches(source, request, indices)
+
+    total = source.featureCount()
+    step = 100.0 / total if total and total > 0 else 0
+    written = 0
+    stream.write(header)
+    for fids, xs, ys, columns in batches:
+        if feedback.isCanceled():
+            break
+        if not len(fids):
+            continue
+        if attributes is not None:
+            columns.append(fids.tolist())
+        if written:
+            stream.write(GEOJSON_SEPARATOR)
+        stream.write(_point_features(xs, ys, columns, keys, precision, drop_nulls))
+        written += len(fids)
+        feedback.setProgress(int(written * step))
+    stream.write(GEOJSON_FOOTER)
+    return written
+
+
+def _feature_point_batches(source, request, indices, batch_size=EXPORT_BATCH_SIZE):
+    """Yield (fids, xs, ys, columns) batches collected from the QGIS feature iterator."""
+    fids, xs, ys, rows = [], [], [], []
+    for feature in source.getFeatures(request):
+        point = feature.geometry().constGet() if feature.hasGeometry() else None
+        fids.append(feature.id())
+        xs.append(point.x() if point is not None else np.nan)
+        ys.append(point.y() if point is not None else np.nan)
+        attributes = feature.attributes()
+        rows.append([attributes[index] for index in indices])
+        if len(fids) >= batch_size:
+            yield _point_batch(fids, xs, ys, rows, len(indices))
+            fids, xs, ys, rows = [], [], [], []
+    if fids:
+        yield _point_batch(fids, xs, ys, rows, len(indices))
+
+
+def _point_batch(fids, xs, ys, rows, column_count):
+    """Turn collected point rows into (fids, xs, ys, columns) arrays."""
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in range(column_count)]
+    return np.asarray(fids, dtype=np.int64), np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64), columns
+
+
+def _arrow_point_batches(path, layer_name, names, batch_size=EXPORT_BATCH_SIZE):
+    """Return a generator of (fids, xs, ys, columns) batches read through GDAL's Arrow interface.
+
+    Returns None when GDAL lacks the Arrow NumPy interface or the fields
+    cannot all be found in the file, the caller then falls back to the
+    feature iterator.
+    """
+    if not hasattr(ogr.Layer, 'GetArrowStreamAsNumPy') or not os.path.exists(path):
+        return None
+    gdal_dataset = gdal.OpenEx(path, gdal.OF_VECTOR)
+    if gdal_dataset is None:
+        return None
+    layer = gdal_dataset.GetLayerByName(layer_name) if layer_name else gdal_dataset.GetLayer(0)
+    if layer is None:
+        return None
+    definition = layer.GetLayerDefn()
+    fid_column = layer.GetFIDColumn() or 'OGC_FID'
+    file_fields = {definition.GetFieldDefn(i).GetName() for i in range(definition.GetFieldCount())}
+    if any(name not in file_fields and name != fid_column for name in names):
+        return None
+    geometry_column = layer.GetGeometryColumn() or 'wkb_geometry'
+
+    def batches(gdal_dataset, layer):
+        # The generator holds the dataset open until the stream is exhausted
+        stream = layer.GetArrowStreamAsNumPy(options=['USE_MASKED_ARRAYS=NO', f'MAX_FEATURES_IN_BATCH={batch_size}'])
+        for batch in stream:
+            xs, ys = _decode_wkb_points(batch[geometry_column])
+            fids = np.asarray(batch[fid_column], dtype=np.int64)
+            columns = [_arrow_column(batch[name]) for name in names]
+            yield fids, xs, ys, columns
+
+    return batches(gdal_dataset, layer)
+
+
+# Little or big endian WKB of a 2D point: byte order, geometry type, x, y.
+_WKB_POINT = [('order', 'u1'), ('type', 'u4'), ('x', 'f8'), ('y', 'f8')]
+
+
+def _decode_wkb_points(wkbs):
+    """Decode an array of 2D point WKB values into x and y arrays, NaN for null geometries."""
+    count = len(wkbs)
+    xs = np.full(count, np.nan)
+    ys = np.full(count, np.nan)
+    present = np.fromiter((wkb is not None and len(wkb) == 21 for wkb in wkbs), dtype=bool, count=count)
+    if present.any():
+        points = np.frombuffer(b''.join(bytes(wkb) for wkb in wkbs[present]), dtype=np.dtype(_WKB_POINT))
+        x = points['x'].copy()
+        y = points['y'].copy()
+        big_endian = points['order'] == 0
+        if big_endian.any():
+            x[big_endian] = x[big_endian].byteswap()
+            y[big_endian] = y[big_endian].byteswap()
+        xs[present] = x
+        ys[present] = y
+    return xs, ys
+
+
+def _arrow_column(values):
+    """Return an Arrow NumPy column as a list of JSON serializable values."""
+    column = values.tolist()
+    if values.dtype.kind == 'f':
+        column = [None if value != value else value for value in column]  # NaN is not valid JSON
+    elif values.dtype == object:
+        column = [value.decode('utf-8', 'replace') if isinstance(value, bytes) else value for value in column]
+    return column
+
+
+def _point_features(xs, ys, columns, keys, precision, drop_nulls):
+    """Format a batch of points and attribute columns as GeoJSON Features, one per line."""
+    geometries = np.char.add(np.char.add('{"type":"Point","coordinates":[', _coordinate_strings(xs, precision)), ',')
+    geometries = np.char.add(np.char.add(geometries, _coordinate_strings(ys, precision)), ']}')
+    geometries = np.where(np.isnan(xs) | np.isnan(ys), 'null', geometries).tolist()
+    encoded = [[json.dumps(value, ensure_ascii=False, default=_json_value) for value in column] for column in columns]
+    rows = zip(*encoded) if encoded else [()] * len(geometries)
+    lines = []
+    for geometry, values in zip(geometries, rows):
+        properties = ','.join(key + value for key, value in zip(keys, values)
+                              if not (drop_nulls and value == 'null'))
+        lines.append(f'{{"type":"Feature","geometry":{geometry},"properties":{{{properties}}}}}')
+    return GEOJSON_SEPARATOR.join(lines)
+
+
+def _coordinate_strings(values, precision):
+    """Format a coordinate array the way GDAL's COORDINATE_PRECISION does.
+
+    Full precision writes the shortest string that reads back to the same
+    double, fixed precision rounds and then drops trailing zeros.
+    """
+    if precision == FULL_PRECISION:
+        return np.array([repr(value) for value in values.tolist()])
+    strings = np.char.mod(f'%.{precision}f', values)
+    if precision > 0:
+        strings = np.char.rstrip(np.char.rstrip(strings, '0'), '.')
+    return strings
+
+
+def _geojson_feature(feature, field_names, precision=FULL_PRECISION, drop_nulls=False):
+    """Serialize a feature as a compact GeoJSON Feature object."""
+    geometry = feature.geometry()
+    geometry_json = geometry.asJson(precision) if not geometry.isNull() else 'null'
+    properties = dict(zip(field_names, feature.attributes()))
+    if drop_nulls:
+        properties = {name: value for name, value in properties.items() if not _is_null(value)}
+    properties = json.dumps(properties,
+                            separators=(',', ':'), ensure_ascii=False, default=_json_value)
+    return f'{{"type":"Feature","geometry":{geometry_json},"properties":{properties}}}'
+
+
+def _is_null(value):
+    """Return True for None and null QVariant attribute values."""
+    return value is None or (isinstance(value, QVariant) and value.isNull())
+
+
+def _json_value(value):
+    """Convert Qt attribute values that json cannot serialize on its own."""
+    if isinstance(value, QVariant):
+        return None if value.isNull() else value.value()
+    if isinstance(value, (QDate, QDateTime, QTime)):
+        return value.toString(Qt.DateFormat.ISODate) if value.isValid() else None
+    if isinstance(value, QByteArray):
+        return bytes(value.toBase64()).decode('ascii')
+    return str(value)
+
+
+def import_geojson_stream(stream, create_sink, feedback, batch_size=IMPORT_BATCH_SIZE, restorer=None,
+                          expected_count=0):
+    """Read GeoJSON features from a stream as they arrive and add them to a sink.
+
+    The sink is created through ``create_sink(fields, wkb_type, crs)`` once the
+    first batch is available; its schema and geometry type are taken from that
+    batch. Properties that only appear later are dropped with a warning. With an
+    AttributeRestorer the attributes left out of the export are re-attached.
+    Progress is reported against ``expected_count``, an estimate of the number
+    of features in the stream, when it is known. The sink takes the CRS named
+    by the FeatureCollection's crs member, WGS 84 without one as RFC 7946 says.
+
+    :return: Tuple (sink, dest_id, count), sink and dest_id are None when the
+        stream held no features.
+    """
+    sink = dest_id = fields = wkb_type = None
+    added = 0
+    unknown_properties = set()
+    batch = []
+    header = {}
+
+    def flush(batch):
+        nonlocal sink, dest_id, fields, wkb_type, added
+        if sink is None:
+            fields = _fields_from_geojson(batch)
+            wkb_type = _wkb_type_from_geojson(batch)
+            sink_fields = fields if restorer is None else restorer.fields(fields)
+            sink, dest_id = create_sink(sink_fields, wkb_type, _crs_from_geojson(header.get('crs')))
+        for feature in batch:
+            unknown_properties.update(set(feature.get('properties') or {}) - set(fields.names()))
+        collection = json.dumps({'type': 'FeatureCollection', 'features': batch})
+        features = QgsJsonUtils.stringToFeatureList(collection, fields)
+        if QgsWkbTypes.isMultiType(wkb_type):
+            for feature in features:
+                if feature.hasGeometry() and not feature.geometry().isMultipart():
+                    geometry = feature.geometry()
+                    geometry.convertToMultiType()
+                    feature.setGeometry(geometry)
+        added += _add_batch(sink, features if restorer is None else restorer.restore(features))
+
+    for feature in iter_geojson_features(stream, header=header):
+        if feedback.isCanceled():
+            break
+        batch.append(feature)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+            if expected_count > 0:
+                feedback.setProgress(min(99, 100 * added / expected_count))
+    if batch and not feedback.isCanceled():
+        flush(batch)
+    if unknown_properties:
+        feedback.pushWarning(f"Properties missing from the first output batch were dropped: "
+                             f"{', '.join(sorted(unknown_properties))}")
+    feedback.pushInfo(f"Imported {added} features from the FME output stream")
+    return sink, dest_id, added
+
+
+def _fields_from_geojson(features):
+    """Build the output fields from the properties of a batch of GeoJSON features."""
+    types = {}
+    for feature in features:
+        for name, value in (feature.get('properties') or {}).items():
+            if value is None:
+                types.setdefault(name, None)
+            elif isinstance(value, bool):
+                types[name] = types.get(name) or QMetaType.Type.Bool
+            elif isinstance(value, int):
+                types[name] = QMetaType.Type.Double if types.get(name) == QMetaType.Type.Double \
+                    else QMetaType.Type.LongLong
+            elif isinstance(value, float):
+                types[name] = QMetaType.Type.Double
+            else:
+                types[name] = QMetaType.Type.QString
+    fields = QgsFields()
+    for name, field_type in types.items():
+        fields.append(QgsField(name, field_type or QMetaType.Type.QString))
+    return fields
+
+
+def _crs_from_geojson(crs_member):
+    """Return the QgsCoordinateReferenceSystem of a GeoJSON crs member, WGS 84 when it is absent or unknown."""
+    name = geojson_crs_name(crs_member)
+    if name:
+        crs = QgsCoordinateReferenceSystem.fromOgcWmsCrs(name)
+        if not crs.isValid():
+            crs = QgsCoordinateReferenceSystem(name)
+        if crs.isValid():
+            return crs
+        QgsMessageLog.logMessage(f"Unknown GeoJSON CRS {name}, assuming WGS 84", "FME Connector", level=Qgis.Warning)
+    return QgsCoordinateReferenceSystem('EPSG:4326')
+
+
+def geojson_crs_name(crs_member):
+    """Return the CRS name of a GeoJSON 2008 named crs member, e.g. urn:ogc:def:crs:EPSG::3857, or None."""
+    if not isinstance(crs_member, dict) or crs_member.get('type') != 'name':
+        return None
+    name = (crs_member.get('properties') or {}).get('name')
+    return name if isinstance(name, str) and name else None
+
+
+def _wkb_type_from_geojson(features):
+    """Return the geometry type for a batch of GeoJSON features, promoted to multi when mixed."""
+    types = {QgsWkbTypes.parseType((f.get('geometry') or {}).get('type', ''))
+             for f in features if f.get('geometry')}
+    types.discard(QgsWkbTypes.Unknown)
+    if not types:
+        return QgsWkbTypes.NoGeometry
+    flat_types = {QgsWkbTypes.flatType(QgsWkbTypes.singleType(t)) for t in types}
+    if len(flat_types) > 1:
+        return QgsWkbTypes.Unknown
+    wkb_type = types.pop()
+    return QgsWkbTypes.multiType(wkb_type) if types or QgsWkbTypes.isMultiType(wkb_type) else wkb_type
+
+
+def iter_geojson_features(stream, chunk_size=1 << 20, header=None):
+    """Yield GeoJSON Feature dicts from a text stream as they arrive.
+
+    Handles a FeatureCollection, whose features array is decoded one element
+    at a time, as well as line-delimited GeoJSON and GeoJSONSeq, so memory
+    stays bounded by the size of a single feature. The crs member of a
+    FeatureCollection is stored in the ``header`` dict when one is given; it
+    is known before the first feature when it precedes the features array.
+    """
+    reader = _JsonStreamReader(stream, chunk_size)
+    while True:
+        char = reader.next_char('\x1e')
+        if char is None:
+            return
+        if char != '{':
+            raise ValueError(f"Unexpected character {char!r} in GeoJSON stream")
+        reader.advance()
+        members = {}
+        streamed_features = False
+        char = reader.next_char()
+        while char != '}':
+            key = reader.decode_value()
+            reader.expect(':')
+            if key == 'features':
+                streamed_features = True
+                reader.expect('[')
+                char = reader.next_char()
+                while char != ']':
+                    yield reader.decode_value()
+                    char = reader.next_char()
+                    if char == ',':
+                        reader.advance()
+                        char = reader.next_char()
+                reader.advance()
+            else:
+                members[key] = reader.decode_value()
+                if key == 'crs' and header is not None and members.get('type') != 'Feature':
+                    header['crs'] = members[key]
+            char = reader.next_char()
+            if char == ',':
+                reader.advance()
+                char = reader.next_char()
+            if char is None:
+                raise ValueError("Truncated GeoJSON stream")
+        reader.advance()
+        if not streamed_features and members.get('type') == 'Feature':
+            yield members
+
+
+class _JsonStreamReader:
+    """Incremental JSON tokenizer over a text stream, used by iter_geojson_features."""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self, size):
+        """Append at least one more chunk to the buffer, dropping consumed text."""
+        chunk = self.stream.read(max(size, self.chunk_size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def next_char(self, skip=''):
+        """Return the next significant character without consuming it, None at end of stream."""
+        while True:
+            while self.pos < len(self.buffer) and (self.buffer[self.pos].isspace() or self.buffer[self.pos] in skip):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read(self.chunk_size):
+                return None
+
+    def advance(self):
+        """Consume the current character."""
+        self.pos += 1
+
+    def expect(self, char):
+        """Consume the next significant character, which must be ``char``."""
+        if self.next_char() != char:
+            raise ValueError(f"Expected {char!r} in GeoJSON stream")
+        self.advance()
+
+    def decode_value(self):
+        """Decode the next complete JSON value, reading more text until it is complete."""
+        self.next_char()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value ending right at the buffer end may be a truncated number
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._read(len(self.buffer) - self.pos):
+                continue
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Lifecycle of the exchange files written for FME runs.
+# Every run allocates its files inside its own run directory, which
+# is deleted when the run ends. Run directories left behind by
+# crashed sessions are swept when the plugin loads, together with
+# referenced outputs and delta states not used for result_days.
+# ---------------------------------------------------------
+
+import glob
+import os
+import shutil
+import sys
+import time
+import uuid
+
+from qgis.core import Qgis, QgsMessageLog
+
+from .qgisfmeformalgorithm_exchange import exchange_settings
+from .qgisfmeformalgorithm_delta import DELTA_DIR_NAME
+
+# Run directories are named <prefix><uuid> and hold a file with the owner's pid.
+RUN_DIR_PREFIX = 'qgis_fme_run_'
+OWNER_FILE = 'owner.pid'
+
+# Loose exchange files written by earlier plugin versions, removed once older
+# than ORPHAN_MAX_AGE seconds.
+LEGACY_PATTERNS = ('fme_input_*', 'fme_output_*')
+ORPHAN_MAX_AGE = 24 * 3600
+
+# Outputs returned by reference are moved out of the run directory into
+# <spill_dir>/<RESULT_DIR_NAME>/<uuid>/ and kept for result_days.
+RESULT_DIR_NAME = 'qgis_fme_results'
+
+
+class ExchangeRun:
+    """Run directory holding the exchange files of one algorithm run.
+
+    Files are allocated with collision-free names inside a uuid-named
+    directory. close() deletes the directory with everything in it; the
+    algorithm calls it whether the run succeeded, failed or was canceled.
+    When ``needed_bytes`` do not fit under the quota of ``base_dir`` the run
+    moves to the spill directory, or goes ahead with a warning; base_dir
+    holds the directory actually used.
+    """
+
+    def __init__(self, base_dir, needed_bytes=0, settings=None, feedback=None):
+        if settings is None:
+            settings = exchange_settings()
+        self.settings = settings
+        if not enforce_quota(base_dir, needed_bytes, settings['quota_mb']):
+            spill_dir = settings['spill_dir']
+            if spill_dir != base_dir and enforce_quota(spill_dir, needed_bytes, settings['quota_mb']):
+                _warn(feedback, f"Exchange quota of {settings['quota_mb']} MB in {base_dir} would be exceeded, "
+                                f"writing the exchange files to {spill_dir}")
+                base_dir = spill_dir
+            else:
+                _warn(feedback, f"Exchange quota of {settings['quota_mb']} MB in {base_dir} would be exceeded by "
+                                f"the estimated {needed_bytes / 1048576:.1f} MB of this run, running anyway. Raise "
+                                f"quota_mb in the [Exchange] section of fme_settings.ini or free up space.")
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, f'{RUN_DIR_PREFIX}{uuid.uuid4().hex}')
+        os.makedirs(self.path)
+        with open(os.path.join(self.path, OWNER_FILE), 'w') as f:
+            f.write(str(os.getpid()))
+
+    def allocate(self, name, extension):
+        """Return the path for a new exchange file in the run directory."""
+        return os.path.join(self.path, f'{name}.{extension}')
+
+    def keep(self, path):
+        """Move an exchange file out of the run directory so it survives close().
+
+        The file is kept in the results directory of the spill directory until
+        it is older than result_days; FME's output can then be returned by
+        reference instead of being copied.
+
+        :return: The new path of the file.
+        """
+        result_dir = os.path.join(self.settings['spill_dir'], RESULT_DIR_NAME, uuid.uuid4().hex)
+        os.makedirs(result_dir)
+        kept = os.path.join(result_dir, os.path.basename(path))
+        shutil.move(path, kept)
+        return kept
+
+    def close(self):
+        """Delete the run directory and all exchange files in it."""
+        if not os.path.isdir(self.path):
+            return
+        freed = directory_size(self.path)
+        shutil.rmtree(self.path, ignore_errors=True)
+        if os.path.isdir(self.path):
+            QgsMessageLog.logMessage(f"Could not remove all exchange files in {self.path}, "
+                                     f"they are swept on the next plugin load", "FME Connector", level=Qgis.Warning)
+        else:
+            QgsMessageLog.logMessage(f"Removed exchange files in {self.path} ({freed / 1048576:.1f} MB)",
+                                     "FME Connector", level=Qgis.Info)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+
+def exchange_roots(settings=None):
+    """Return the directories exchange files can be written to."""
+    if settings is None:
+        settings = exchange_settings()
+    roots = [settings['ram_dir'], settings['spill_dir']]
+    return [root for root in dict.fromkeys(roots) if root and os.path.isdir(root)]
+
+
+def sweep_orphans(roots=None):
+    """Delete run directories whose owning QGIS process is gone, expired results and delta states
+    and stale legacy files.
+
+    :return: Number of bytes freed.
+    """
+    result_max_age = exchange_settings()['result_days'] * 24 * 3600
+    freed = 0
+    for root in roots if roots is not None else exchange_roots():
+        for run_dir in glob.glob(os.path.join(root, f'{RUN_DIR_PREFIX}*')):
+            if _is_orphan(run_dir):
+                freed += directory_size(run_dir)
+                shutil.rmtree(run_dir, ignore_errors=True)
+        for result_dir in (glob.glob(os.path.join(root, RESULT_DIR_NAME, '*'))
+                           + glob.glob(os.path.join(root, DELTA_DIR_NAME, '*'))):
+            try:
+                expired = time.time() - os.path.getmtime(result_dir) > result_max_age
+            except OSError:
+                continue
+            if expired:
+                freed += directory_size(result_dir)
+                shutil.rmtree(result_dir, ignore_errors=True)
+        for pattern in LEGACY_PATTERNS:
+            for path in glob.glob(os.path.join(root, pattern)):
+                try:
+                    if time.time() - os.path.getmtime(path) > ORPHAN_MAX_AGE:
+                        size = os.path.getsize(path)
+                        os.remove(path)
+                        freed += size
+                except OSError:
+                    pass
+    if freed:
+        QgsMessageLog.logMessage(f"Swept {freed / 1048576:.1f} MB of orphaned exchange files",
+                                 "FME Connector", level=Qgis.Info)
+    return freed
+
+
+def enforce_quota(root, needed_bytes, quota_mb):
+    """Make room for a run under the exchange disk quota.
+
+    Orphaned run directories are swept first when the quota would be exceeded.
+    A quota of 0 disables the check.
+
+    :return: False when the run still does not fit under the quota.
+    """
+    if not quota_mb:
+        return True
+    quota = quota_mb * 1024 * 1024
+    if _exchange_usage(root) + needed_bytes <= quota:
+        return True
+    sweep_orphans([root])
+    return _exchange_usage(root) + needed_bytes <= quota
+
+
+def _warn(feedback, message):
+    """Report a warning to the processing feedback, or the message log without one."""
+    if feedback is not None:
+        feedback.pushWarning(message)
+    else:
+        QgsMessageLog.logMessage(message, "FME Connector", level=Qgis.Warning)
+
+
+def _exchange_usage(root):
+    """Return the bytes used by run directories, kept results and delta states in an exchange root."""
+    return (sum(directory_size(run_dir) for run_dir in glob.glob(os.path.join(root, f'{RUN_DIR_PREFIX}*')))
+            + directory_size(os.path.join(root, RESULT_DIR_NAME))
+            + directory_size(os.path.join(root, DELTA_DIR_NAME)))
+
+
+def directory_size(path):
+    """Return the total size of the files below a directory."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+def _is_orphan(run_dir):
+    """Return True when the process that created the run directory no longer runs."""
+    try:
+        with open(os.path.join(run_dir, OWNER_FILE)) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        # No readable owner, only treat it as orphaned once it is old
+        try:
+            return time.time() - os.path.getmtime(run_dir) > ORPHAN_MAX_AGE
+        except OSError:
+            return False
+    return pid != os.getpid() and not _pid_alive(pid)
+
+
+def _pid_alive(pid):
+    """Return True when a process with the given pid is running."""
+    if sys.platform == 'win32':
+        import ctypes
+        process_query_limited_information = 0x1000
+        still_active = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == still_active
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Tests for the FME command line helpers: removing the dataset
+# arguments the algorithm supplies and mapping extra input layers
+# to workspace readers.
+# Run from the plugin folder inside the QGIS Python environment:
+# python -m unittest discover -s test
+# ---------------------------------------------------------
+
+import unittest
+
+from utilities import plugin_module
+
+algorithm = plugin_module('qgisfmeformalgorithm_algorithm')
+
+
+class Layer:
+    """Stand-in for a QgsVectorLayer with a name and an id."""
+
+    def __init__(self, name, layer_id=None):
+        self._name = name
+        self._id = layer_id or f'{name}_id'
+
+    def name(self):
+        return self._name
+
+    def id(self):
+        return self._id
+
+
+class StripDatasetArgumentsTest(unittest.TestCase):
+
+    def test_strips_given_parameters(self):
+        cmd_list = ['fme', 'workspace.fmw', '--SourceDataset_GPKG', 'in.gpkg',
+                    '--DestDataset_GPKG', 'out.gpkg', '--BUFFER', '10']
+        self.assertEqual(
+            algorithm._strip_dataset_arguments(cmd_list, ['SourceDataset_GPKG', 'DestDataset_GPKG']),
+            ['fme', 'workspace.fmw', '--BUFFER', '10'])
+
+    def test_keeps_other_datasets(self):
+        cmd_list = ['fme', 'workspace.fmw', '--SourceDataset_GPKG', 'in.gpkg',
+                    '--SourceDataset_CSV_2', 'lookup.csv']
+        self.assertEqual(algorithm._strip_dataset_arguments(cmd_list, ['SourceDataset_GPKG']),
+                         ['fme', 'workspace.fmw', '--SourceDataset_CSV_2', 'lookup.csv'])
+
+    def test_ignores_missing_parameters(self):
+        cmd_list = ['fme', 'workspace.fmw', '--BUFFER', '10']
+        self.assertEqual(algorithm._strip_dataset_arguments(cmd_list, [None, '', 'SourceDataset_GPKG']), cmd_list)
+
+
+class ParseInputMappingTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(algorithm._parse_input_mapping(''), {})
+        self.assertEqual(algorithm._parse_input_mapping(None), {})
+
+    def test_separators_and_spaces(self):
+        self.assertEqual(
+            algorithm._parse_input_mapping(' roads = SourceDataset_GPKG ;rivers=SourceDataset_SHAPEFILE\n'
+                                           'parcels=SourceDataset_CSV_2'),
+            {'roads': 'SourceDataset_GPKG', 'rivers': 'SourceDataset_SHAPEFILE',
+             'parcels': 'SourceDataset_CSV_2'})
+
+    def test_skips_items_without_equals(self):
+        self.assertEqual(algorithm._parse_input_mapping('roads;;rivers=SourceDataset_GPKG'),
+                         {'rivers': 'SourceDataset_GPKG'})
+
+    def test_equals_in_parameter(self):
+        self.assertEqual(algorithm._parse_input_mapping('roads=a=b'), {'roads': 'a=b'})
+
+
+class MapInputLayersTest(unittest.TestCase):
+
+    def test_workspace_order(self):
+        roads, rivers = Layer('roads'), Layer('rivers')
+        self.assertEqual(algorithm._map_input_layers([roads, rivers], ['A', 'B'], {}),
+                         [(roads, 'A'), (rivers, 'B')])
+
+    def test_mapping_by_name_and_id(self):
+        roads, rivers, parcels = Layer('roads'), Layer('rivers', 'layer_2'), Layer('parcels')
+        pairs = algorithm._map_input_layers([roads, rivers, parcels], ['A', 'B', 'C'],
+                                            {'parcels': 'A', 'layer_2': 'C'})
+        self.assertEqual(pairs, [(roads, 'B'), (rivers, 'C'), (parcels, 'A')])
+
+    def test_more_layers_than_readers(self):
+        roads, rivers = Layer('roads'), Layer('rivers')
+        self.assertEqual(algorithm._map_input_layers([roads, rivers], ['A'], {}),
+                         [(roads, 'A'), (rivers, None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
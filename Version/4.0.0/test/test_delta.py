@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Tests for the delta mode change detection and its stored state.
+# Run from the plugin folder inside the QGIS Python environment:
+# python -m unittest discover -s test
+# ---------------------------------------------------------
+
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from contextlib import closing
+
+from utilities import plugin_module, settings
+
+delta = plugin_module('qgisfmeformalgorithm_delta')
+
+
+class DeltaPlanTest(unittest.TestCase):
+
+    def test_first_run_changes_everything(self):
+        changed, deleted = delta.delta_plan({3: b'c', 1: b'a', 2: b'b'}, {})
+        self.assertEqual(changed, [1, 2, 3])
+        self.assertEqual(deleted, set())
+
+    def test_unchanged(self):
+        hashes = {1: b'a', 2: b'b'}
+        self.assertEqual(delta.delta_plan(hashes, dict(hashes)), ([], set()))
+
+    def test_inserted_modified_and_deleted(self):
+        changed, deleted = delta.delta_plan({1: b'a', 2: b'B', 4: b'd'}, {1: b'a', 2: b'b', 3: b'c'})
+        self.assertEqual(changed, [2, 4])
+        self.assertEqual(deleted, {3})
+
+
+class DeltaStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state = delta.DeltaState('key', settings(self.directory.name))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_state(self, hashes):
+        os.makedirs(self.state.path, exist_ok=True)
+        with closing(sqlite3.connect(self.state.state_path)) as connection, connection:
+            connection.execute('CREATE TABLE hashes (fid INTEGER PRIMARY KEY, hash BLOB NOT NULL)')
+            connection.executemany('INSERT INTO hashes VALUES (?, ?)', hashes.items())
+        open(self.state.output_path, 'wb').close()
+
+    def test_path(self):
+        self.assertEqual(self.state.path, os.path.join(self.directory.name, delta.DELTA_DIR_NAME, 'key'))
+
+    def test_load_without_state(self):
+        self.assertIsNone(self.state.load())
+
+    def test_load_without_output(self):
+        self.write_state({1: b'a'})
+        os.remove(self.state.output_path)
+        self.assertIsNone(self.state.load())
+
+    def test_load(self):
+        self.write_state({1: b'a', 2: b'b'})
+        self.assertEqual(self.state.load(), {1: b'a', 2: b'b'})
+
+    def test_load_marks_the_state_used(self):
+        self.write_state({1: b'a'})
+        old = time.time() - 30 * 24 * 3600
+        os.utime(self.state.path, (old, old))
+        self.state.load()
+        self.assertGreater(os.path.getmtime(self.state.path), old + 3600)
+
+    def test_unreadable_state(self):
+        os.makedirs(self.state.path)
+        with open(self.state.state_path, 'wb') as state_file:
+            state_file.write(b'not a database')
+        open(self.state.output_path, 'wb').close()
+        self.assertIsNone(self.state.load())
+
+    def test_clear(self):
+        self.write_state({1: b'a'})
+        self.state.clear()
+        self.assertFalse(os.path.exists(self.state.path))
+        self.assertIsNone(self.state.load())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Tests for the cache of exported input files.
+# Run from the plugin folder inside the QGIS Python environment:
+# python -m unittest discover -s test
+# ---------------------------------------------------------
+
+import os
+import tempfile
+import time
+import unittest
+
+from utilities import plugin_module, settings
+
+cache = plugin_module('qgisfmeformalgorithm_cache')
+
+
+class ExportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = self.make_cache(cache_mb=1)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_cache(self, cache_mb):
+        return cache.ExportCache(settings(self.directory.name, cache_mb=cache_mb))
+
+    def export(self, key, size=10, export_cache=None):
+        """Stage an exchange file of ``size`` bytes and commit it under ``key``."""
+        export_cache = export_cache or self.cache
+        staging_dir = export_cache.reserve()
+        path = os.path.join(staging_dir, 'fme_input.gpkg')
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        return export_cache.commit(key, staging_dir, [path])
+
+    def set_used(self, key, age):
+        manifest_path = os.path.join(self.cache.root, key, cache.MANIFEST_FILE)
+        used = time.time() - age
+        os.utime(manifest_path, (used, used))
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.lookup('missing'))
+
+    def test_reserve(self):
+        staging_dir = self.cache.reserve()
+        self.assertTrue(os.path.isdir(staging_dir))
+        self.assertTrue(os.path.basename(staging_dir).startswith(cache.STAGING_PREFIX))
+        self.assertNotEqual(staging_dir, self.cache.reserve())
+
+    def test_discard(self):
+        staging_dir = self.cache.reserve()
+        open(os.path.join(staging_dir, 'fme_input.gpkg'), 'wb').close()
+        self.cache.discard(staging_dir)
+        self.assertFalse(os.path.exists(staging_dir))
+
+    def test_commit_and_lookup(self):
+        paths = self.export('key')
+        self.assertEqual(paths, [os.path.join(self.cache.root, 'key', 'fme_input.gpkg')])
+        self.assertEqual(self.cache.lookup('key'), paths)
+        self.assertEqual([name for name in os.listdir(self.cache.root)], ['key'])
+
+    def test_lookup_with_missing_file(self):
+        paths = self.export('key')
+        os.remove(paths[0])
+        self.assertIsNone(self.cache.lookup('key'))
+
+    def test_commit_replaces_broken_entry(self):
+        broken_dir = os.path.join(self.cache.root, 'key')
+        os.makedirs(broken_dir)
+        open(os.path.join(broken_dir, 'partial.gpkg'), 'wb').close()
+        paths = self.export('key')
+        self.assertEqual(self.cache.lookup('key'), paths)
+        self.assertFalse(os.path.exists(os.path.join(broken_dir, 'partial.gpkg')))
+
+    def test_commit_after_concurrent_commit(self):
+        first = self.export('key')
+        second = self.export('key')
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(self.cache.root), ['key'])
+
+    def test_evict_least_recently_used(self):
+        for key in ('old', 'used', 'new'):
+            self.export(key, size=1000)
+        self.set_used('old', 300)
+        self.set_used('used', 100)
+        self.set_used('new', 200)
+        small_cache = self.make_cache(cache_mb=2500 / 1048576)
+        small_cache.evict()
+        self.assertIsNone(small_cache.lookup('old'))
+        self.assertIsNotNone(small_cache.lookup('used'))
+        self.assertIsNotNone(small_cache.lookup('new'))
+
+    def test_evict_keeps_entry(self):
+        small_cache = self.make_cache(cache_mb=0)
+        self.export('other', export_cache=small_cache)
+        paths = self.export('key', export_cache=small_cache)
+        self.assertEqual(small_cache.lookup('key'), paths)
+        self.assertIsNone(small_cache.lookup('other'))
+
+    def test_evict_old_staging_directories(self):
+        old_dir = self.cache.reserve()
+        new_dir = self.cache.reserve()
+        old = time.time() - cache.ORPHAN_MAX_AGE - 60
+        os.utime(old_dir, (old, old))
+        self.cache.evict()
+        self.assertFalse(os.path.exists(old_dir))
+        self.assertTrue(os.path.isdir(new_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
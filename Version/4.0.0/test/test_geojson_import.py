@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Tests for the import of a streamed GeoJSON FME output: the CRS,
+# fields and geometry type of the sink. Run from the plugin folder
+# inside the QGIS Python environment: python -m unittest discover -s test
+# ---------------------------------------------------------
+
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtCore import QMetaType  # noqa: E402
+from qgis.core import QgsApplication, QgsWkbTypes  # noqa: E402
+
+from qgisfmeformalgorithm_exchange import import_geojson_stream  # noqa: E402
+
+application = None
+
+
+def setUpModule():
+    global application
+    if QgsApplication.instance() is None:
+        application = QgsApplication([], False)
+        application.initQgis()
+
+
+def point(x, y, **properties):
+    return {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [x, y]}, 'properties': properties}
+
+
+def polygon(properties=None, multi=False):
+    ring = [[0, 0], [1, 0], [1, 1], [0, 0]]
+    geometry = {'type': 'MultiPolygon', 'coordinates': [[ring]]} if multi else \
+        {'type': 'Polygon', 'coordinates': [ring]}
+    return {'type': 'Feature', 'geometry': geometry, 'properties': properties or {}}
+
+
+class Sink:
+    """Feature sink recording what it is created with and the features added to it."""
+
+    def __init__(self):
+        self.fields = self.wkb_type = self.crs = None
+        self.features = []
+
+    def create(self, fields, wkb_type, crs):
+        self.fields, self.wkb_type, self.crs = fields, wkb_type, crs
+        return self, 'sink_id'
+
+    def addFeatures(self, features, flags=None):
+        self.features.extend(features)
+        return True
+
+    def lastError(self):
+        return ''
+
+
+class ImportGeojsonStreamTest(unittest.TestCase):
+
+    def import_collection(self, features, crs=None, batch_size=100):
+        collection = {'type': 'FeatureCollection'}
+        if crs:
+            collection['crs'] = {'type': 'name', 'properties': {'name': crs}}
+        collection['features'] = features
+        sink = Sink()
+        feedback = mock.Mock()
+        feedback.isCanceled.return_value = False
+        result = import_geojson_stream(io.StringIO(json.dumps(collection)), sink.create, feedback, batch_size)
+        return sink, feedback, result
+
+    def test_crs_from_collection(self):
+        sink, _, _ = self.import_collection([point(1, 2)], crs='urn:ogc:def:crs:EPSG::3857')
+        self.assertEqual(sink.crs.authid(), 'EPSG:3857')
+
+    def test_crs84(self):
+        sink, _, _ = self.import_collection([point(1, 2)], crs='urn:ogc:def:crs:OGC:1.3:CRS84')
+        self.assertTrue(sink.crs.isValid())
+        self.assertTrue(sink.crs.isGeographic())
+
+    def test_wgs84_without_crs(self):
+        sink, _, _ = self.import_collection([point(1, 2)])
+        self.assertEqual(sink.crs.authid(), 'EPSG:4326')
+
+    def test_wgs84_with_unknown_crs(self):
+        sink, _, _ = self.import_collection([point(1, 2)], crs='urn:ogc:def:crs:NONE::1')
+        self.assertEqual(sink.crs.authid(), 'EPSG:4326')
+
+    def test_field_types(self):
+        sink, _, (_, dest_id, count) = self.import_collection([
+            point(0, 0, name='a', count=1, ratio=1, flag=True, empty=None),
+            point(1, 1, name='b', count=2, ratio=0.5, flag=False, empty=None),
+        ])
+        self.assertEqual((dest_id, count), ('sink_id', 2))
+        fields = sink.fields
+        self.assertEqual(fields.names(), ['name', 'count', 'ratio', 'flag', 'empty'])
+        self.assertEqual(fields.field('name').type(), QMetaType.Type.QString)
+        self.assertEqual(fields.field('count').type(), QMetaType.Type.LongLong)
+        self.assertEqual(fields.field('ratio').type(), QMetaType.Type.Double)
+        self.assertEqual(fields.field('flag').type(), QMetaType.Type.Bool)
+        self.assertEqual(fields.field('empty').type(), QMetaType.Type.QString)
+        self.assertEqual(sink.features[1]['ratio'], 0.5)
+
+    def test_properties_after_first_batch_are_dropped(self):
+        sink, feedback, _ = self.import_collection([point(0, 0, name='a'), point(1, 1, name='b', late=1)],
+                                                   batch_size=1)
+        self.assertEqual(sink.fields.names(), ['name'])
+        self.assertEqual(len(sink.features), 2)
+        self.assertIn('late', feedback.pushWarning.call_args[0][0])
+
+    def test_geometry_type(self):
+        sink, _, _ = self.import_collection([point(0, 0), point(1, 1)])
+        self.assertEqual(sink.wkb_type, QgsWkbTypes.Point)
+
+    def test_mixed_single_and_multi_geometries(self):
+        sink, _, _ = self.import_collection([polygon(), polygon(multi=True)])
+        self.assertEqual(sink.wkb_type, QgsWkbTypes.MultiPolygon)
+        self.assertTrue(all(feature.geometry().isMultipart() for feature in sink.features))
+
+    def test_without_geometries(self):
+        sink, _, _ = self.import_collection([{'type': 'Feature', 'geometry': None, 'properties': {'a': 1}}])
+        self.assertEqual(sink.wkb_type, QgsWkbTypes.NoGeometry)
+
+    def test_empty_stream(self):
+        sink, _, result = self.import_collection([])
+        self.assertEqual(result, (None, None, 0))
+        self.assertIsNone(sink.fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
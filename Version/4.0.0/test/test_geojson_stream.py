@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Tests for the streaming GeoJSON reader used to import FME output
+# from a pipe. Run from the plugin folder inside the QGIS Python
+# environment: python -m unittest discover -s test
+# ---------------------------------------------------------
+
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qgisfmeformalgorithm_exchange import geojson_crs_name, iter_geojson_features  # noqa: E402
+
+
+class ChunkedStream:
+    """Text stream returning at most ``size`` characters per read, like a pipe."""
+
+    def __init__(self, text, size):
+        self.stream = io.StringIO(text)
+        self.size = size
+
+    def read(self, size=-1):
+        return self.stream.read(self.size if size < 0 else min(size, self.size))
+
+
+def _features(count):
+    return [{'type': 'Feature', 'id': i,
+             'geometry': {'type': 'Point', 'coordinates': [101.123456789 + i, 3.5 - i]},
+             'properties': {'name': f'feature {i} ä "quoted"', 'value': 12345.678 * i, 'empty': None}}
+            for i in range(count)]
+
+
+class IterGeoJsonFeaturesTest(unittest.TestCase):
+
+    def test_feature_collection(self):
+        features = _features(5)
+        text = json.dumps({'type': 'FeatureCollection', 'name': 'out',
+                           'crs': {'type': 'name', 'properties': {'name': 'EPSG:3857'}},
+                           'features': features}, indent=2)
+        self.assertEqual(list(iter_geojson_features(io.StringIO(text))), features)
+
+    def test_empty_feature_collection(self):
+        text = '{"type": "FeatureCollection", "features": []}'
+        self.assertEqual(list(iter_geojson_features(io.StringIO(text))), [])
+
+    def test_geojson_seq(self):
+        features = _features(4)
+        text = '\n'.join(json.dumps(feature) for feature in features) + '\n'
+        self.assertEqual(list(iter_geojson_features(io.StringIO(text))), features)
+
+    def test_geojson_seq_record_separators(self):
+        features = _features(4)
+        text = ''.join(f'\x1e{json.dumps(feature)}\n' for feature in features)
+        self.assertEqual(list(iter_geojson_features(io.StringIO(text))), features)
+
+    def test_values_split_across_chunks(self):
+        features = _features(20)
+        collection = json.dumps({'type': 'FeatureCollection', 'features': features})
+        sequence = ''.join(f'\x1e{json.dumps(feature)}\n' for feature in features)
+        for text in (collection, sequence):
+            for size in (1, 2, 3, 7, 64):
+                with self.subTest(size=size, sequence=text is sequence):
+                    stream = ChunkedStream(text, size)
+                    self.assertEqual(list(iter_geojson_features(stream, chunk_size=size)), features)
+
+    def test_number_at_chunk_end(self):
+        text = '{"type": "Feature", "geometry": null, "properties": {"value": 1234567}}'
+        split = text.index('4567')
+        stream = ChunkedStream(text, split)
+        features = list(iter_geojson_features(stream, chunk_size=split))
+        self.assertEqual(features[0]['properties']['value'], 1234567)
+
+    def test_truncated_feature_collection(self):
+        text = json.dumps({'type': 'FeatureCollection', 'features': _features(3)})
+        for end in (len(text) - 1, len(text) - 2, text.index('12345.678') + 3, text.index('"features"') + 12):
+            with self.subTest(end=end):
+                with self.assertRaises(ValueError):
+                    list(iter_geojson_features(ChunkedStream(text[:end], 16), chunk_size=16))
+
+    def test_truncated_geojson_seq(self):
+        text = '\n'.join(json.dumps(feature) for feature in _features(3))
+        with self.assertRaises(ValueError):
+            list(iter_geojson_features(io.StringIO(text[:-1])))
+
+    def test_features_before_truncation_are_yielded(self):
+        features = _features(3)
+        text = json.dumps({'type': 'FeatureCollection', 'features': features})
+        read = []
+        with self.assertRaises(ValueError):
+            for feature in iter_geojson_features(io.StringIO(text[:-2])):
+                read.append(feature)
+        self.assertEqual(read, features)
+
+    def test_collection_crs(self):
+        crs = {'type': 'name', 'properties': {'name': 'urn:ogc:def:crs:EPSG::3857'}}
+        text = json.dumps({'type': 'FeatureCollection', 'crs': crs, 'features': _features(2)})
+        header = {}
+        features = iter_geojson_features(ChunkedStream(text, 5), chunk_size=5, header=header)
+        next(features)
+        # The crs member precedes the features, so it is known when the first feature arrives
+        self.assertEqual(header['crs'], crs)
+        self.assertEqual(geojson_crs_name(header['crs']), 'urn:ogc:def:crs:EPSG::3857')
+        list(features)
+        self.assertEqual(header['crs'], crs)
+
+    def test_without_crs(self):
+        header = {}
+        text = '\n'.join(json.dumps(feature) for feature in _features(2))
+        list(iter_geojson_features(io.StringIO(text), header=header))
+        self.assertNotIn('crs', header)
+        self.assertIsNone(geojson_crs_name(header.get('crs')))
+        self.assertIsNone(geojson_crs_name({'type': 'link', 'properties': {'href': 'x'}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Tests for the exchange run directories, the disk quota and the
+# sweeping of orphaned and expired exchange files.
+# Run from the plugin folder inside the QGIS Python environment:
+# python -m unittest discover -s test
+# ---------------------------------------------------------
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from utilities import plugin_module, settings
+
+lifecycle = plugin_module('qgisfmeformalgorithm_lifecycle')
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
+
+def make_old(path, age=lifecycle.ORPHAN_MAX_AGE + 60):
+    old = time.time() - age
+    os.utime(path, (old, old))
+
+
+def dead_pid():
+    """Return the pid of a process that has exited."""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class LifecycleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+        patcher = mock.patch.object(lifecycle, 'exchange_settings', lambda: settings(self.root, result_days=1))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_dir(self, owner=None, size=0):
+        """Create a run directory owned by the pid ``owner``, without owner file when None."""
+        path = os.path.join(self.root, f'{lifecycle.RUN_DIR_PREFIX}{len(os.listdir(self.root))}')
+        os.makedirs(path)
+        if owner is not None:
+            with open(os.path.join(path, lifecycle.OWNER_FILE), 'w') as f:
+                f.write(str(owner))
+        if size:
+            write_file(os.path.join(path, 'fme_input.gpkg'), size)
+        return path
+
+
+class IsOrphanTest(LifecycleTest):
+
+    def test_own_run(self):
+        self.assertFalse(lifecycle._is_orphan(self.run_dir(os.getpid())))
+
+    def test_dead_owner(self):
+        self.assertTrue(lifecycle._is_orphan(self.run_dir(dead_pid())))
+
+    def test_without_owner_file(self):
+        run_dir = self.run_dir()
+        self.assertFalse(lifecycle._is_orphan(run_dir))
+        make_old(run_dir)
+        self.assertTrue(lifecycle._is_orphan(run_dir))
+
+    def test_unreadable_owner_file(self):
+        run_dir = self.run_dir('not a pid')
+        self.assertFalse(lifecycle._is_orphan(run_dir))
+        make_old(run_dir)
+        self.assertTrue(lifecycle._is_orphan(run_dir))
+
+
+class SweepOrphansTest(LifecycleTest):
+
+    def test_run_directories(self):
+        own = self.run_dir(os.getpid(), size=10)
+        orphan = self.run_dir(dead_pid(), size=20)
+        size = lifecycle.directory_size(orphan)
+        self.assertEqual(lifecycle.sweep_orphans([self.root]), size)
+        self.assertTrue(os.path.isdir(own))
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_expired_results_and_delta_states(self):
+        for name in (lifecycle.RESULT_DIR_NAME, lifecycle.DELTA_DIR_NAME):
+            write_file(os.path.join(self.root, name, 'old', 'output.gpkg'), 10)
+            write_file(os.path.join(self.root, name, 'new', 'output.gpkg'), 10)
+            make_old(os.path.join(self.root, name, 'old'), age=2 * 24 * 3600)
+        self.assertEqual(lifecycle.sweep_orphans([self.root]), 20)
+        for name in (lifecycle.RESULT_DIR_NAME, lifecycle.DELTA_DIR_NAME):
+            self.assertEqual(os.listdir(os.path.join(self.root, name)), ['new'])
+
+    def test_legacy_files(self):
+        old = os.path.join(self.root, 'fme_input_1.gpkg')
+        new = os.path.join(self.root, 'fme_output_2.gpkg')
+        unrelated = os.path.join(self.root, 'other.gpkg')
+        for path in (old, new, unrelated):
+            write_file(path, 10)
+        make_old(old)
+        make_old(unrelated)
+        self.assertEqual(lifecycle.sweep_orphans([self.root]), 10)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+        self.assertTrue(os.path.exists(unrelated))
+
+
+class EnforceQuotaTest(LifecycleTest):
+
+    def test_no_quota(self):
+        self.run_dir(os.getpid(), size=2 * 1048576)
+        self.assertTrue(lifecycle.enforce_quota(self.root, 1048576, 0))
+
+    def test_fits(self):
+        self.run_dir(os.getpid(), size=1048576)
+        self.assertTrue(lifecycle.enforce_quota(self.root, 1000, 2))
+
+    def test_sweeps_to_make_room(self):
+        orphan = self.run_dir(dead_pid(), size=1048576)
+        self.assertTrue(lifecycle.enforce_quota(self.root, 1048576, 1))
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_does_not_fit(self):
+        self.run_dir(os.getpid(), size=1048576)
+        self.assertFalse(lifecycle.enforce_quota(self.root, 1, 1))
+
+    def test_delta_states_count(self):
+        write_file(os.path.join(self.root, lifecycle.DELTA_DIR_NAME, 'key', 'output.gpkg'), 1048576)
+        self.assertFalse(lifecycle.enforce_quota(self.root, 1, 1))
+
+
+class ExchangeRunTest(LifecycleTest):
+
+    def test_run_directory(self):
+        with lifecycle.ExchangeRun(self.root, settings=settings(self.root)) as run:
+            self.assertEqual(run.base_dir, self.root)
+            self.assertEqual(run.allocate('fme_input', 'gpkg'), os.path.join(run.path, 'fme_input.gpkg'))
+            with open(os.path.join(run.path, lifecycle.OWNER_FILE)) as f:
+                self.assertEqual(int(f.read()), os.getpid())
+        self.assertFalse(os.path.exists(run.path))
+
+    def test_keep(self):
+        with lifecycle.ExchangeRun(self.root, settings=settings(self.root)) as run:
+            path = run.allocate('fme_output', 'gpkg')
+            write_file(path, 10)
+            kept = run.keep(path)
+        self.assertTrue(os.path.isfile(kept))
+        self.assertEqual(os.path.dirname(os.path.dirname(kept)), os.path.join(self.root, lifecycle.RESULT_DIR_NAME))
+
+    def test_spills_over_quota(self):
+        ram_dir = os.path.join(self.root, 'ram')
+        spill_dir = os.path.join(self.root, 'spill')
+        os.makedirs(spill_dir)
+        self.run_dir_in(ram_dir)
+        feedback = mock.Mock()
+        run = lifecycle.ExchangeRun(ram_dir, 1, settings(spill_dir, ram_dir=ram_dir, quota_mb=1), feedback)
+        try:
+            self.assertEqual(run.base_dir, spill_dir)
+            self.assertTrue(run.path.startswith(spill_dir))
+            feedback.pushWarning.assert_called_once()
+        finally:
+            run.close()
+
+    def run_dir_in(self, root):
+        path = os.path.join(root, f'{lifecycle.RUN_DIR_PREFIX}busy')
+        write_file(os.path.join(path, 'fme_input.gpkg'), 1048576)
+        with open(os.path.join(path, lifecycle.OWNER_FILE), 'w') as f:
+            f.write(str(os.getpid()))
+
+
+if __name__ == '__main__':
+    unittest.main()
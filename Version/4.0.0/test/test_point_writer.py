@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Tests for the NumPy helpers of the vectorized GeoJSON point writer.
+# Run from the plugin folder inside the QGIS Python environment:
+# python -m unittest discover -s test
+# ---------------------------------------------------------
+
+import json
+import os
+import struct
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qgisfmeformalgorithm_exchange import (  # noqa: E402
+    FULL_PRECISION, _coordinate_strings, _decode_wkb_points, _point_features, np)
+
+
+def point_wkb(x, y, big_endian=False):
+    """Return the WKB of a 2D point."""
+    if big_endian:
+        return struct.pack('>BIdd', 0, 1, x, y)
+    return struct.pack('<BIdd', 1, 1, x, y)
+
+
+@unittest.skipIf(np is None, 'NumPy is not available')
+class DecodeWkbPointsTest(unittest.TestCase):
+
+    def decode(self, wkbs):
+        values = np.empty(len(wkbs), dtype=object)
+        values[:] = wkbs
+        return _decode_wkb_points(values)
+
+    def test_little_endian(self):
+        xs, ys = self.decode([point_wkb(1.5, -2.25), point_wkb(101.7, 3.1)])
+        self.assertEqual(xs.tolist(), [1.5, 101.7])
+        self.assertEqual(ys.tolist(), [-2.25, 3.1])
+
+    def test_big_endian(self):
+        xs, ys = self.decode([point_wkb(1.5, -2.25, big_endian=True), point_wkb(4.0, 5.0)])
+        self.assertEqual(xs.tolist(), [1.5, 4.0])
+        self.assertEqual(ys.tolist(), [-2.25, 5.0])
+
+    def test_null_and_non_point_geometries(self):
+        line = struct.pack('<BII4d', 1, 2, 2, 0.0, 0.0, 1.0, 1.0)
+        xs, ys = self.decode([None, point_wkb(7.0, 8.0), line])
+        self.assertTrue(np.isnan(xs[0]) and np.isnan(ys[0]))
+        self.assertEqual((xs[1], ys[1]), (7.0, 8.0))
+        self.assertTrue(np.isnan(xs[2]) and np.isnan(ys[2]))
+
+    def test_memoryview_values(self):
+        xs, ys = self.decode([memoryview(point_wkb(1.0, 2.0))])
+        self.assertEqual((xs[0], ys[0]), (1.0, 2.0))
+
+
+@unittest.skipIf(np is None, 'NumPy is not available')
+class CoordinateStringsTest(unittest.TestCase):
+
+    def test_full_precision_round_trips(self):
+        values = np.array([0.1, 100.0, 1e-05, 101.123456789012345])
+        strings = _coordinate_strings(values, FULL_PRECISION).tolist()
+        self.assertEqual(strings[:3], ['0.1', '100.0', '1e-05'])
+        self.assertEqual([float(string) for string in strings], values.tolist())
+
+    def test_fixed_precision_drops_trailing_zeros(self):
+        values = np.array([0.1, 100.0, 101.5, 2.123456789])
+        self.assertEqual(_coordinate_strings(values, 7).tolist(), ['0.1', '100', '101.5', '2.1234568'])
+
+    def test_zero_precision_keeps_integer_zeros(self):
+        self.assertEqual(_coordinate_strings(np.array([10.0, 99.6]), 0).tolist(), ['10', '100'])
+
+    def test_features_are_valid_json(self):
+        xs = np.array([1.0, np.nan])
+        ys = np.array([2.5, np.nan])
+        text = _point_features(xs, ys, [['a', None]], ['"name":'], 7, drop_nulls=True)
+        features = [json.loads(line.rstrip(',')) for line in text.split('\n')]
+        self.assertEqual(features[0]['geometry'], {'type': 'Point', 'coordinates': [1, 2.5]})
+        self.assertEqual(features[0]['properties'], {'name': 'a'})
+        self.assertIsNone(features[1]['geometry'])
+        self.assertEqual(features[1]['properties'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+__author__ = 'GIS Innovation Sdn. Bhd.'
+__date__ = '2025-04-17'
+__copyright__ = '(C) 2025 by GIS Innovation Sdn. Bhd.'
+
+# This will get replaced with a git SHA1 when you do a git archive
+
+__revision__ = '$Format:%H$'
+
+# ---------------------------------------------------------
+# Helpers shared by the tests.
+# ---------------------------------------------------------
+
+import importlib
+import os
+import sys
+import types
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE = 'qgisfmeformalgorithm_plugin'
+
+
+def plugin_module(name):
+    """Import a plugin module that uses relative imports.
+
+    The plugin folder is registered as a package without running its
+    __init__, which would load the whole Processing provider.
+    """
+    if PACKAGE not in sys.modules:
+        package = types.ModuleType(PACKAGE)
+        package.__path__ = [PLUGIN_DIR]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f'{PACKAGE}.{name}')
+
+
+def settings(root, **values):
+    """Return exchange settings with every directory under ``root``."""
+    result = {
+        'ram_dir': os.path.join(root, 'ram'),
+        'memory_budget_mb': 0,
+        'spill_dir': root,
+        'quota_mb': 0,
+        'cache_mb': 0,
+        'result_days': 0,
+    }
+    result.update(values)
+    return result